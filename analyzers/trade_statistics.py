@@ -1,3 +1,4 @@
+import heapq
 import math
 import numpy as np
 
@@ -5,20 +6,97 @@ from backtrader import Analyzer
 from backtrader.utils import AutoOrderedDict
 
 
-class BasicTradeStats(Analyzer):
-    params = (
-        ("calcStatsAfterEveryTrade", False),
-        ("filter", "all"),
-        ("useStandardPrint", False),
-    )
+class PnlList(object):
+    # every value is kept and the figures are recomputed with numpy on demand
 
-    def nextstart(self):
-        o = self.rets
-        o.all.firstStrategyTradingDate = self.datas[0].datetime.datetime(0)
-        self.next()
+    def __init__(self):
+        self.values = []
 
-    def next(self):
-        self.rets.all.lastStrategyTradingDate = self.datas[0].datetime.datetime(0)
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        self.values.append(value)
+
+    def total(self):
+        return np.sum(self.values)
+
+    def mean(self):
+        return np.mean(self.values)
+
+    def max(self):
+        return np.max(self.values)
+
+    def min(self):
+        return np.min(self.values)
+
+    def median(self):
+        return np.median(self.values)
+
+
+class RunningPnl(object):
+    # same figures in constant time per value: a compensated running sum,
+    # running extremes and an exact median kept in two heaps, the lower
+    # half negated so both are min-heaps
+
+    def __init__(self):
+        self.count = 0
+        self._sum = 0.0
+        self._compensation = 0.0
+        self._max = None
+        self._min = None
+        self._lower = []
+        self._upper = []
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        self.count += 1
+
+        t = self._sum + value
+        if abs(self._sum) >= abs(value):
+            self._compensation += (self._sum - t) + value
+        else:
+            self._compensation += (value - t) + self._sum
+        self._sum = t
+
+        if self._max is None or value > self._max:
+            self._max = value
+        if self._min is None or value < self._min:
+            self._min = value
+
+        if not self._lower or value <= -self._lower[0]:
+            heapq.heappush(self._lower, -value)
+        else:
+            heapq.heappush(self._upper, value)
+
+        if len(self._lower) > len(self._upper) + 1:
+            heapq.heappush(self._upper, -heapq.heappop(self._lower))
+        elif len(self._upper) > len(self._lower):
+            heapq.heappush(self._lower, -heapq.heappop(self._upper))
+
+    def total(self):
+        return self._sum + self._compensation
+
+    def mean(self):
+        return self.total() / self.count
+
+    def max(self):
+        return self._max
+
+    def min(self):
+        return self._min
+
+    def median(self):
+        if len(self._lower) > len(self._upper):
+            return -self._lower[0]
+        return (-self._lower[0] + self._upper[0]) / 2
+
+
+class TradeStatsBase(object):
+    # bookkeeping shared by the BasicTradeStats analyzer and TradeStats,
+    # which replays trades simulated outside of Cerebro
 
     def create_analysis(self):
         if self.p.filter == "long":
@@ -33,12 +111,12 @@ class BasicTradeStats(Analyzer):
                 + " 'all' not '%s'." % str(self.p.filter)
             )
 
-        self._all_pnl_list = []
-        self._won_pnl_list = []
-        self._lost_pnl_list = []
+        self._all_pnl_list = self.series()
+        self._won_pnl_list = self.series()
+        self._lost_pnl_list = self.series()
         self._curStreak = None
-        self._wonStreak_list = []
-        self._lostStreak_list = []
+        self._wonStreak_list = self.series()
+        self._lostStreak_list = self.series()
 
         o = self.rets = AutoOrderedDict()
         o.all.firstStrategyTradingDate = None
@@ -77,31 +155,36 @@ class BasicTradeStats(Analyzer):
             oWL.streak.average = None
             oWL.streak.median = None
 
+    def series(self):
+        if self.p.streamingStats:
+            return RunningPnl()
+        return PnlList()
+
     def calculate_statistics(self):
-        if self._all_pnl_list != []:
+        if len(self._all_pnl_list):
             oA = self.rets.all
             oW = self.rets.won
             oL = self.rets.lost
-            oA.pnl.total = np.sum(self._all_pnl_list)
-            oA.pnl.average = np.mean(self._all_pnl_list)
+            oA.pnl.total = self._all_pnl_list.total()
+            oA.pnl.average = self._all_pnl_list.mean()
 
             for each in ["won", "lost"]:
                 pnlList = eval("self._" + str(each) + "_pnl_list")
-                if pnlList != []:
+                if len(pnlList):
                     oWL = self.rets[each]
-                    oWL.trades.closed = np.size(pnlList)
+                    oWL.trades.closed = len(pnlList)
                     oWL.trades.percent = len(pnlList) / len(self._all_pnl_list) * 100
-                    oWL.pnl.total = np.sum(pnlList)
-                    oWL.pnl.max = np.max(pnlList) if each == "won" else np.min(pnlList)
-                    oWL.pnl.average = np.mean(pnlList)
-                    oWL.pnl.median = np.median(pnlList)
+                    oWL.pnl.total = pnlList.total()
+                    oWL.pnl.max = pnlList.max() if each == "won" else pnlList.min()
+                    oWL.pnl.average = pnlList.mean()
+                    oWL.pnl.median = pnlList.median()
                     streak = eval("self._" + str(each) + "Streak_list")
-                    if streak != []:
-                        oWL.streak.max = np.max(streak)
-                        oWL.streak.average = np.mean(streak)
-                        oWL.streak.median = int(np.median(streak))
+                    if len(streak):
+                        oWL.streak.max = streak.max()
+                        oWL.streak.average = streak.mean()
+                        oWL.streak.median = int(streak.median())
             oA.stats.winRate = oW.trades.percent
-            if self._won_pnl_list != [] and self._lost_pnl_list != []:
+            if len(self._won_pnl_list) and len(self._lost_pnl_list):
                 oA.streak.zScore = self.zScore(
                     oW.trades.closed, oL.trades.closed, len(self._wonStreak_list)
                 )
@@ -142,33 +225,38 @@ class BasicTradeStats(Analyzer):
     def preparation_pre_calculation(self, trade):
 
         if trade.justopened:
-            self.rets.all.trades.total += 1
-            self.rets.all.trades.open += 1
+            self.trade_opened()
 
         elif trade.status == trade.Closed:
-            self.rets.all.trades.open += -1
-            self.rets.all.trades.closed += 1
-            pnl = trade.pnlcomm
-            self._all_pnl_list.append(pnl)
-            if pnl >= 0:
-                self._won_pnl_list.append(pnl)
-                if self._curStreak == "Won":
-                    self.rets.won.streak.current += 1
-                else:
-                    self._curStreak = "Won"
-                    self._lostStreak_list.append(self.rets.lost.streak.current)
-                    self.rets.lost.streak.current = 0
-                    self.rets.won.streak.current += 1
+            self.trade_closed(trade.pnlcomm)
+
+    def trade_opened(self):
+        self.rets.all.trades.total += 1
+        self.rets.all.trades.open += 1
+
+    def trade_closed(self, pnl):
+        self.rets.all.trades.open += -1
+        self.rets.all.trades.closed += 1
+        self._all_pnl_list.append(pnl)
+        if pnl >= 0:
+            self._won_pnl_list.append(pnl)
+            if self._curStreak == "Won":
+                self.rets.won.streak.current += 1
             else:
-                self._lost_pnl_list.append(pnl)
-                if self._curStreak == "Lost":
-                    self.rets.lost.streak.current += 1
+                self._curStreak = "Won"
+                self._lostStreak_list.append(self.rets.lost.streak.current)
+                self.rets.lost.streak.current = 0
+                self.rets.won.streak.current += 1
+        else:
+            self._lost_pnl_list.append(pnl)
+            if self._curStreak == "Lost":
+                self.rets.lost.streak.current += 1
 
-                else:
-                    self._curStreak = "Lost"
-                    self._wonStreak_list.append(self.rets.won.streak.current)
-                    self.rets.won.streak.current = 0
-                    self.rets.lost.streak.current += 1
+            else:
+                self._curStreak = "Lost"
+                self._wonStreak_list.append(self.rets.won.streak.current)
+                self.rets.won.streak.current = 0
+                self.rets.lost.streak.current += 1
 
     def notify_trade(self, trade):
 
@@ -184,12 +272,12 @@ class BasicTradeStats(Analyzer):
 
     def stop(self):
         self.calculate_statistics()
-        self._all_pnl_list = []
-        self._won_pnl_list = []
-        self._lost_pnl_list = []
+        self._all_pnl_list = self.series()
+        self._won_pnl_list = self.series()
+        self._lost_pnl_list = self.series()
         self._curStreak = None
-        self._wonStreak_list = []
-        self._lostStreak_list = []
+        self._wonStreak_list = self.series()
+        self._lostStreak_list = self.series()
 
         self.rets._close()
 
@@ -518,3 +606,64 @@ class BasicTradeStats(Analyzer):
             return _st
         else:
             return str(n)
+
+
+class BasicTradeStats(TradeStatsBase, Analyzer):
+    params = (
+        ("calcStatsAfterEveryTrade", False),
+        ("filter", "all"),
+        ("useStandardPrint", False),
+        # constant work per trade, for calcStatsAfterEveryTrade on long runs
+        ("streamingStats", False),
+    )
+
+    def nextstart(self):
+        o = self.rets
+        o.all.firstStrategyTradingDate = self.datas[0].datetime.datetime(0)
+        self.next()
+
+    def next(self):
+        self.rets.all.lastStrategyTradingDate = self.datas[0].datetime.datetime(0)
+
+
+class TradeStats(TradeStatsBase):
+    """BasicTradeStats figures for trades simulated outside of Cerebro.
+
+    ``run`` takes records with ``long`` and ``pnlcomm`` attributes, the
+    latter ``None`` for trades still open at the end.
+    """
+
+    def __init__(self,
+                 filter="all",
+                 calcStatsAfterEveryTrade=False,
+                 streamingStats=False):
+        self.p = AutoOrderedDict()
+        self.p.filter = filter
+        self.p.calcStatsAfterEveryTrade = calcStatsAfterEveryTrade
+        self.p.useStandardPrint = False
+        self.p.streamingStats = streamingStats
+        self.create_analysis()
+
+    def run(self, trades, first, last):
+        self.rets.all.firstStrategyTradingDate = first
+        self.rets.all.lastStrategyTradingDate = last
+
+        for trade in trades:
+            if self.p.filter != "all" and trade.long != (self.p.filter
+                                                         == "long"):
+                continue
+
+            self.trade_opened()
+            if self.p.calcStatsAfterEveryTrade:
+                self.calculate_statistics()
+
+            if trade.pnlcomm is not None:
+                self.trade_closed(trade.pnlcomm)
+                if self.p.calcStatsAfterEveryTrade:
+                    self.calculate_statistics()
+
+        self.stop()
+        return self.rets
+
+    def get_analysis(self):
+        return self.rets
@@ -1,8 +1,11 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import logging
 import backtrader
-import pandas
-import sqlite3
 from indicators.dmi import DirectionalMovementIndex
+from engine.logger import configure, logger
+from feeds.numpy_feed import NumpyData
+from store.prefetch import prefetch
 
 
 class DmiCrossOver(backtrader.Strategy):
@@ -28,11 +31,14 @@ class DmiCrossOver(backtrader.Strategy):
                                                          self.dmi.minusDI,
                                                          plot=True)
 
-    def log(self, txt, dt=None):
+    def log(self, txt, dt=None, level=logging.INFO):
+        if not logger.isEnabledFor(level):
+            return
+
         if dt is None:
             dt = self.datas[0].datetime.datetime()
 
-        print("%s, %s" % (dt, txt))
+        logger.log(level, "%s, %s", dt, txt)
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -54,7 +60,7 @@ class DmiCrossOver(backtrader.Strategy):
                 self.log(f"*** SELL EXECUTED, Price: {order_details}  ***")
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log("Order Canceled/Margin/Rejected")
+            self.log("Order Canceled/Margin/Rejected", level=logging.WARNING)
 
         self.order = None
 
@@ -107,7 +113,7 @@ class DmiCrossOver(backtrader.Strategy):
         # stoploss
         # nearest swing high
         elif (self.position and not self.bought_today and self.sold_today
-              and self.data.close[0] > self.long_stoploss):
+              and self.data.close[0] > self.short_stoploss):
             self.order = self.close()
             self.sold_today = False
             self.log(f"=== SHORT SELL STOPLOSS HIT | LOSER ===")
@@ -130,42 +136,27 @@ class DmiCrossOver(backtrader.Strategy):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless",
+                        action="store_true",
+                        help="no plots, only warnings are logged")
+    args = parser.parse_args()
+    configure(headless=args.headless)
+
     database_path_fifteen_minute = "./databases/app-minute-fifteen.db"
-    conn = sqlite3.connect(database_path_fifteen_minute)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(stock_id) as stock_id FROM stock_price_minute
-    """)
-
-    stocks = cursor.fetchall()
-    for stock in stocks:
-        print(f"*** Testing {stock['stock_id']} ***")
+    for stock_id, arrays in prefetch(database_path_fifteen_minute):
+        print(f"*** Testing {stock_id} ***")
         cerebro = backtrader.Cerebro()
         cerebro.broker.setcash(100000.0)
         cerebro.broker.setcommission(commission=0.010)
 
         # cerebro.addsizer(backtrader.sizers.PercentSizer, percents=50)
 
-        dataframe = pandas.read_sql(
-            """
-            select datetime, open, high, low, close, volume
-            from stock_price_minute
-            where stock_id = :stock_id
-            and strftime('%H:%M:%S', datetime) >= '09:30:00' 
-            and strftime('%H:%M:%S', datetime) < '16:00:00'
-            order by datetime asc
-        """,
-            conn,
-            params={"stock_id": stock["stock_id"]},
-            index_col="datetime",
-            parse_dates=["datetime"],
-        )
-
-        data = backtrader.feeds.PandasData(dataname=dataframe)
+        data = NumpyData(dataname=arrays)
         cerebro.adddata(data)
         cerebro.addstrategy(DmiCrossOver)
 
         # strats = cerebro.optstrategy(OpeningRangeBreakout, num_opening_bars=[15, 30, 60])
         cerebro.run()
-        cerebro.plot(style="candlestick")
+        if not args.headless:
+            cerebro.plot(style="candlestick")
@@ -0,0 +1,53 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import contextlib
+import logging
+import logging.handlers
+import sys
+
+# strategies log through this instead of print() so batch runs can drop or
+# buffer the per-order chatter
+logger = logging.getLogger("back_track")
+
+
+def configure(headless=False, level=None, capacity=10000, stream=None):
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    if headless:
+        # write in blocks of `capacity` records, errors go out at once
+        handler = logging.handlers.MemoryHandler(capacity,
+                                                 flushLevel=logging.ERROR,
+                                                 target=handler)
+        level = logging.WARNING if level is None else level
+
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO if level is None else level)
+    logger.propagate = False
+    return logger
+
+
+@contextlib.contextmanager
+def configured(headless=False, level=None, capacity=10000, stream=None):
+    # configure() for the duration of a block, then the previous setup
+    saved = list(logger.handlers), logger.level, logger.propagate
+    for handler in saved[0]:
+        logger.removeHandler(handler)
+    try:
+        yield configure(headless, level, capacity, stream)
+    finally:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        for handler in saved[0]:
+            logger.addHandler(handler)
+        logger.setLevel(saved[1])
+        logger.propagate = saved[2]
+
+
+configure()
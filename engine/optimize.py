@@ -0,0 +1,151 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import concurrent.futures
+import contextlib
+import itertools
+import os
+import random
+
+import pandas
+
+from engine.logger import configure, configured
+from engine.runner import CASH, COMMISSION, backtest, summarize
+from store.cache import CACHE_DIRECTORY, BarCache
+from store.quality import passing
+from store.schema import SESSION
+from store.shared import SharedBars, attach
+
+# strategy and memory-mapped (or shared memory) arrays of every symbol in the
+# sweep, attached once per worker process
+_worker = {}
+
+
+def grid(space):
+    names = sorted(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def sample(space, n, seed=0):
+    # n distinct combinations drawn from the grid without building it
+    names = sorted(space)
+    sizes = [len(space[name]) for name in names]
+    total = 1
+    for size in sizes:
+        total *= size
+
+    rng = random.Random(seed)
+    for number in rng.sample(range(total), min(n, total)):
+        params = {}
+        for name, size in zip(reversed(names), reversed(sizes)):
+            number, i = divmod(number, size)
+            params[name] = space[name][i]
+        yield params
+
+
+def _attach(strategy, path, stock_ids, query, directory, handle, headless):
+    if headless:
+        configure(headless=True)
+
+    _worker["strategy"] = strategy
+    _worker["tick"] = query["tick"]
+    if handle is not None:
+        _worker["arrays"] = attach(handle)
+    else:
+        _worker["arrays"] = BarCache(directory).arrays(
+            path, stock_ids, **query)
+
+
+def _combination(job):
+    stock_id, params, broker = job
+    arrays = _worker["arrays"][stock_id]
+    cerebro, strat = backtest(_worker["strategy"],
+                              arrays,
+                              params,
+                              tick=_worker["tick"],
+                              **broker)
+    row = dict(params, stock_id=stock_id)
+    row.update(summarize(cerebro, strat))
+    return row
+
+
+def optimize(strategy,
+             path,
+             space,
+             stock_ids=None,
+             n=None,
+             seed=0,
+             processes=None,
+             session=SESSION,
+             start=None,
+             end=None,
+             timeframe=None,
+             compact=False,
+             tick=None,
+             cash=CASH,
+             commission=COMMISSION,
+             directory=CACHE_DIRECTORY,
+             validate=False,
+             shared=False,
+             headless=True):
+    """Backtest every symbol x parameter combination across processes.
+
+    ``space`` maps strategy params to candidate values; the full grid is
+    run unless ``n`` asks for that many random combinations. Workers attach
+    the memory-mapped bars once and only receive (symbol, params) per job.
+    ``validate`` skips symbols failing ``store.quality.scan``. With
+    ``shared`` the bars are copied once into a shared memory block
+    (``store.shared``) that workers attach to instead of the cache files.
+    ``headless`` drops the strategies' per-order logging whatever the
+    number of processes.
+    """
+    query = dict(session=session,
+                 start=start,
+                 end=end,
+                 timeframe=timeframe,
+                 compact=compact,
+                 tick=tick)
+    if validate:
+        stock_ids = passing(path, stock_ids, session=session)
+    bars = BarCache(directory).arrays(path, stock_ids, **query)
+    stock_ids = list(bars)
+
+    combinations = list(grid(space) if n is None else sample(space, n, seed))
+    broker = dict(cash=cash, commission=commission)
+    jobs = [(stock_id, params, broker)
+            for params in combinations for stock_id in stock_ids]
+
+    initargs = (strategy, path, stock_ids, query, directory)
+
+    processes = processes or os.cpu_count()
+    if processes == 1 or len(jobs) <= 1:
+        _attach(*initargs, handle=None, headless=False)
+        # the same logging setup as the pool workers
+        with (configured(headless=True)
+              if headless else contextlib.nullcontext()):
+            rows = [_combination(job) for job in jobs]
+    else:
+        chunksize = max(1, len(jobs) // (processes * 4))
+        with contextlib.ExitStack() as stack:
+            handle = None
+            if shared:
+                handle = stack.enter_context(SharedBars(bars)).handle
+            pool = stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(
+                    processes,
+                    initializer=_attach,
+                    initargs=initargs + (handle, headless)))
+            rows = list(pool.map(_combination, jobs, chunksize=chunksize))
+
+    return pandas.DataFrame(rows)
+
+
+def rank(table, params, by="all.stats.profitFactor"):
+    # one row per parameter combination, best first
+    ranked = table.groupby(params).agg(
+        pnl=("pnl", "sum"),
+        trades=("all.trades.closed", "sum"),
+        score=(by, "mean"),
+    )
+    return ranked.sort_values("score", ascending=False)
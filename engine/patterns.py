@@ -0,0 +1,74 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy
+
+# candle checks over whole columns; on tick arrays (store.ticks) the
+# comparisons are exact. Each returns a bool array, one entry per bar.
+
+
+def open_is_low(bars):
+    return numpy.asarray(bars["open"]) == numpy.asarray(bars["low"])
+
+
+def open_is_high(bars):
+    return numpy.asarray(bars["open"]) == numpy.asarray(bars["high"])
+
+
+def close_is_high(bars):
+    return numpy.asarray(bars["close"]) == numpy.asarray(bars["high"])
+
+
+def close_is_low(bars):
+    return numpy.asarray(bars["close"]) == numpy.asarray(bars["low"])
+
+
+def _previous(values):
+    # values shifted one bar later; the first bar compares with itself and
+    # is masked off by the callers
+    return numpy.concatenate([values[:1], values[:-1]])
+
+
+def bullish_engulfing(bars):
+    # EngulfingPattern's long entry candle
+    o = numpy.asarray(bars["open"])
+    c = numpy.asarray(bars["close"])
+    po, pc = _previous(o), _previous(c)
+    found = ((c > o) & (pc <= c) & (pc >= o) & (po <= c) & (po >= o))
+    found[:1] = False
+    return found
+
+
+def bearish_engulfing(bars):
+    # EngulfingPattern's short entry candle
+    o = numpy.asarray(bars["open"])
+    c = numpy.asarray(bars["close"])
+    po, pc = _previous(o), _previous(c)
+    found = ((o > c) & (pc <= o) & (pc > c) & (po <= o) & (po > c))
+    found[:1] = False
+    return found
+
+
+def moving_sum(values, period):
+    """Rolling sum over ``period`` bars, NaN before the first full window.
+
+    Integer input is summed exactly in int64 (no drift from a running
+    float sum), so on tick arrays ``moving_sum(...) / period`` is the SMA
+    rounded once.
+    """
+    values = numpy.asarray(values)
+    if values.dtype.kind in "iu":
+        total = numpy.cumsum(values, dtype=numpy.int64)
+    else:
+        total = numpy.cumsum(values, dtype=numpy.float64)
+
+    out = numpy.full(len(values), numpy.nan)
+    if len(values) >= period:
+        window = total[period - 1:].copy()
+        window[1:] -= total[:-period]
+        out[period - 1:] = window
+    return out
+
+
+def sma(values, period):
+    return moving_sum(values, period) / period
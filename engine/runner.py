@@ -0,0 +1,149 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import concurrent.futures
+import contextlib
+import os
+
+import backtrader
+import pandas
+
+from analyzers.trade_statistics import BasicTradeStats
+from engine.logger import configure, configured
+from feeds.numpy_feed import NumpyData
+from store.cache import CACHE_DIRECTORY, BarCache
+from store.prefetch import prefetch
+from store.quality import passing
+from store.schema import SESSION
+
+CASH = 100000.0
+COMMISSION = 0.010
+
+
+def backtest(strategy,
+             arrays,
+             params=None,
+             cash=CASH,
+             commission=COMMISSION,
+             tick=None):
+    cerebro = backtrader.Cerebro()
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+    cerebro.adddata(NumpyData(dataname=arrays, tick=tick))
+    cerebro.addstrategy(strategy, **(params or {}))
+    cerebro.addanalyzer(BasicTradeStats)
+    return cerebro, cerebro.run()[0]
+
+
+def flatten(analysis, prefix=""):
+    row = {}
+    for key, value in analysis.items():
+        if isinstance(value, dict):
+            row.update(flatten(value, prefix + key + "."))
+        else:
+            row[prefix + key] = value
+    return row
+
+
+def summarize(cerebro, strat):
+    row = dict(value=cerebro.broker.getvalue())
+    row["pnl"] = row["value"] - cerebro.broker.startingcash
+    for analyzer in strat.analyzers:
+        if isinstance(analyzer, BasicTradeStats):
+            row.update(flatten(analyzer.get_analysis()))
+    return row
+
+
+def _job(job):
+    strategy, path, stock_id, params, query, directory, broker = job
+    arrays = BarCache(directory).arrays(path, [stock_id], **query)[stock_id]
+    cerebro, strat = backtest(strategy,
+                              arrays,
+                              params,
+                              tick=query["tick"],
+                              **broker)
+    return summarize(cerebro, strat)
+
+
+def run(strategy,
+        path,
+        stock_ids=None,
+        params=None,
+        processes=None,
+        session=SESSION,
+        start=None,
+        end=None,
+        timeframe=None,
+        compact=False,
+        tick=None,
+        cash=CASH,
+        commission=COMMISSION,
+        directory=CACHE_DIRECTORY,
+        validate=False,
+        headless=True):
+    """Backtest ``strategy`` on every symbol of ``path``, one per process.
+
+    Returns one row of broker value and ``BasicTradeStats`` figures per
+    symbol. ``processes=1`` runs the same jobs in this process, loading the
+    next symbols in the background (``store.prefetch``); the numbers are
+    identical either way since every symbol gets its own Cerebro.
+    ``validate`` skips symbols failing ``store.quality.scan``. ``tick``
+    loads prices as integer ticks of that size (``store.ticks``), making
+    price equality checks in the strategy exact. ``headless`` drops the
+    strategies' per-order logging in either mode (``engine.logger``);
+    without it they log through the current setup.
+    """
+    query = dict(session=session,
+                 start=start,
+                 end=end,
+                 timeframe=timeframe,
+                 compact=compact,
+                 tick=tick)
+    if validate:
+        stock_ids = passing(path, stock_ids, session=session)
+
+    broker = dict(cash=cash, commission=commission)
+    processes = processes or os.cpu_count()
+    if processes == 1:
+        rows, ids = [], []
+        with _logging(headless):
+            for stock_id, arrays in prefetch(path,
+                                             stock_ids,
+                                             directory=directory,
+                                             **query):
+                cerebro, strat = backtest(strategy,
+                                          arrays,
+                                          params,
+                                          tick=tick,
+                                          **broker)
+                rows.append(summarize(cerebro, strat))
+                ids.append(stock_id)
+        return _table(rows, ids)
+
+    # fill the cache up front so workers only ever memory-map it
+    stock_ids = BarCache(directory).fill(path, stock_ids, **query)
+
+    jobs = [(strategy, path, stock_id, params, query, directory, broker)
+            for stock_id in stock_ids]
+    if len(jobs) <= 1:
+        with _logging(headless):
+            rows = [_job(job) for job in jobs]
+    else:
+        # per-order logging from workers would only interleave
+        with concurrent.futures.ProcessPoolExecutor(
+                processes,
+                initializer=configure if headless else None,
+                initargs=(True, )) as pool:
+            rows = list(pool.map(_job, jobs))
+    return _table(rows, stock_ids)
+
+
+def _logging(headless):
+    # the pool workers' setup for jobs run in this process
+    return configured(headless=True) if headless else contextlib.nullcontext()
+
+
+def _table(rows, stock_ids):
+    table = pandas.DataFrame(rows, index=stock_ids)
+    table.index.name = "stock_id"
+    return table
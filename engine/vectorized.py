@@ -0,0 +1,429 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import datetime
+import math
+
+import numpy
+import pandas
+from numpy.lib.stride_tricks import sliding_window_view
+
+from analyzers.trade_statistics import TradeStats
+from engine.optimize import grid, sample
+from engine.runner import CASH, COMMISSION, flatten
+from indicators.supertrend import average_true_range
+from store.cache import CACHE_DIRECTORY, BarCache
+from store.quality import passing
+from store.schema import SESSION
+from store.ticks import from_ticks
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# What a crossover strategy's next() sees on each bar, precomputed for the
+# whole series. ``start`` is the first bar next() runs on, the strategy's
+# minimum period.
+Signals = collections.namedtuple(
+    "Signals", "start long_entry short_entry long_stop short_stop")
+
+# One round trip of size 1; ``exit`` is -1 and the exit fields NaN for a
+# position still open at the end of the data.
+Trade = collections.namedtuple(
+    "Trade", "long entry exit entry_price exit_price pnl pnlcomm")
+
+_OPEN_LONG, _OPEN_SHORT, _CLOSE = 1, -1, 2
+
+
+def _smoothing(data, line, alpha, start, end):
+    # backtrader's ExponentialSmoothing.once
+    alpha1 = 1.0 - alpha
+    prev = line[start - 1]
+    for i in range(start, end):
+        prev = prev * alpha1 + data[i] * alpha
+        line[i] = prev
+
+
+def _simulate(open_, close, long_entry, short_entry, long_stop, short_stop,
+              commission, start, side, entry, exit_, entry_price, exit_price):
+    # The strategies' next()/notify_order() as a state machine. Market orders
+    # fill at the next bar's open, before next() runs on that bar, and the
+    # target is set on the fill: 1.5 times the distance from the
+    # commission-adjusted price to the stop.
+    count = 0
+    position = 0
+    pending = 0
+    stop = 0.0
+    target = 0.0
+    for i in range(start, len(close)):
+        if pending == _CLOSE:
+            exit_[count - 1] = i
+            exit_price[count - 1] = open_[i]
+            position = 0
+        elif pending != 0:
+            price = open_[i]
+            if pending == _OPEN_LONG:
+                paid = price + price * commission
+                target = paid + (paid - stop) * 1.5
+            else:
+                received = price - price * commission
+                target = received - (stop - received) * 1.5
+            position = pending
+            side[count] = pending
+            entry[count] = i
+            entry_price[count] = price
+            count += 1
+        pending = 0
+
+        if position == 0:
+            if long_entry[i]:
+                pending = _OPEN_LONG
+                stop = long_stop[i]
+            elif short_entry[i]:
+                pending = _OPEN_SHORT
+                stop = short_stop[i]
+        elif position == _OPEN_LONG:
+            if close[i] > target or close[i] < stop:
+                pending = _CLOSE
+        elif close[i] < target or close[i] > stop:
+            pending = _CLOSE
+
+    return count
+
+
+if njit is not None:
+    _compiled = {
+        kernel: njit(cache=True)(kernel)
+        for kernel in (_smoothing, _simulate)
+    }
+else:
+    _compiled = {}
+
+
+def smoothing(data, period, first, alpha):
+    """ExponentialSmoothing of ``data`` valid from index ``first``.
+
+    Seeded with the mean of the first ``period`` values, NaN before, and
+    bit-for-bit what backtrader computes in once() mode.
+    """
+    data = numpy.asarray(data, dtype=numpy.float64)
+    line = numpy.full(len(data), numpy.nan)
+    seed = first + period - 1
+    if len(data) <= seed:
+        return line
+
+    line[seed] = math.fsum(data[first:seed + 1]) / period
+    kernel = _compiled.get(_smoothing)
+    if kernel is not None:
+        kernel(data, line, alpha, seed + 1, len(data))
+        return line
+
+    line = line.tolist()
+    _smoothing(data.tolist(), line, alpha, seed + 1, len(data))
+    return numpy.array(line)
+
+
+def ema(data, period, first=0):
+    return smoothing(data, period, first, 2.0 / (1.0 + period))
+
+
+def smma(data, period, first=0):
+    return smoothing(data, period, first, 1.0 / period)
+
+
+def crossover(data0, data1, first):
+    """backtrader's CrossOver: +1.0 / -1.0 on the bars data0 crosses data1.
+
+    ``first`` is the index the indicator's difference is seeded on, one
+    before the first bar with a value.
+    """
+    diff = numpy.asarray(data0) - numpy.asarray(data1)
+    cross = numpy.full(len(diff), numpy.nan)
+    if len(diff) <= first + 1:
+        return cross
+
+    # last non-zero difference, carried over zero differences
+    nzd = diff.copy()
+    nzd[:first] = numpy.nan
+    held = numpy.where((nzd != 0) | (numpy.arange(len(nzd)) == first),
+                       numpy.arange(len(nzd)), 0)
+    nzd = nzd[numpy.maximum.accumulate(held)]
+
+    before = nzd[first:-1]
+    after = diff[first + 1:]
+    up = (before < 0.0) & (after > 0.0)
+    down = (before > 0.0) & (after < 0.0)
+    cross[first + 1:] = up.astype(numpy.float64) - down
+    return cross
+
+
+def rsi(close, period=14):
+    close = numpy.asarray(close, dtype=numpy.float64)
+    change = numpy.full(len(close), numpy.nan)
+    change[1:] = close[1:] - close[:-1]
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        rs = (smma(numpy.maximum(change, 0.0), period, 1) /
+              smma(numpy.maximum(-change, 0.0), period, 1))
+    return 100.0 - 100.0 / (1.0 + rs)
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    line = ema(close, fast) - ema(close, slow)
+    first = max(fast, slow) - 1
+    return line, ema(line, signal, first)
+
+
+def directional_indicator(high, low, close, period=14):
+    high, low = (numpy.asarray(a, dtype=numpy.float64) for a in (high, low))
+    atr = average_true_range(high, low, close, period)
+
+    upmove = numpy.full(len(high), numpy.nan)
+    downmove = numpy.full(len(high), numpy.nan)
+    upmove[1:] = high[1:] - high[:-1]
+    downmove[1:] = low[:-1] - low[1:]
+
+    plus = numpy.where((upmove > downmove) & (upmove > 0.0), upmove, 0.0)
+    minus = numpy.where((downmove > upmove) & (downmove > 0.0), downmove, 0.0)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        plus_di = 100.0 * smma(plus, period, 1) / atr
+        minus_di = 100.0 * smma(minus, period, 1) / atr
+    return plus_di, minus_di
+
+
+def _previous(values):
+    shifted = numpy.full(len(values), numpy.nan)
+    shifted[1:] = values[:-1]
+    return shifted
+
+
+def _rolling(values, size, reduce):
+    # min/max of the last ``size`` values, like min(line.get(size=size))
+    rolled = numpy.full(len(values), numpy.nan)
+    if len(values) >= size:
+        rolled[size - 1:] = reduce(sliding_window_view(values, size), axis=1)
+    return rolled
+
+
+def ema_crossover(arrays, ema_slow=21, ema_fast=9, ema_long=200):
+    close = numpy.asarray(arrays["close"], dtype=numpy.float64)
+    trend = ema(close, ema_long)
+    cross = crossover(ema(close, ema_fast), ema(close, ema_slow),
+                      max(ema_slow, ema_fast) - 1)
+
+    with numpy.errstate(invalid="ignore"):
+        return Signals(
+            start=max(ema_long, max(ema_slow, ema_fast) + 1) - 1,
+            long_entry=(cross > 0) & (close > trend),
+            short_entry=(cross < 0) & (close < trend),
+            long_stop=_previous(numpy.asarray(arrays["low"], numpy.float64)),
+            short_stop=_previous(numpy.asarray(arrays["high"],
+                                               numpy.float64)),
+        )
+
+
+def _swing_stops(arrays):
+    return (_rolling(numpy.asarray(arrays["low"], numpy.float64), 5,
+                     numpy.min),
+            _rolling(numpy.asarray(arrays["high"], numpy.float64), 5,
+                     numpy.max))
+
+
+def macd_crossover(arrays, macd_fast=12, macd_slow=26, macd_sig=9,
+                   ema_period=200):
+    close = numpy.asarray(arrays["close"], dtype=numpy.float64)
+    trend = ema(close, ema_period)
+    line, signal = macd(close, macd_fast, macd_slow, macd_sig)
+    # the signal line's minimum period
+    minperiod = max(macd_fast, macd_slow) + macd_sig - 1
+    cross = crossover(line, signal, minperiod - 1)
+    long_stop, short_stop = _swing_stops(arrays)
+
+    with numpy.errstate(invalid="ignore"):
+        return Signals(
+            start=max(ema_period, minperiod + 1) - 1,
+            long_entry=(cross == 1) & (close > trend),
+            short_entry=(cross == -1) & (close < trend),
+            long_stop=long_stop,
+            short_stop=short_stop,
+        )
+
+
+def rsi_crossover(arrays, upperband=70, safelow=50, lowerband=30, ema=200):
+    # the bands only draw the RSI plot, entries are crossings of 50
+    close = numpy.asarray(arrays["close"], dtype=numpy.float64)
+    trend = smoothing(close, ema, 0, 2.0 / (1.0 + ema))
+    cross = crossover(rsi(close), 50.0, 14)
+    long_stop, short_stop = _swing_stops(arrays)
+
+    with numpy.errstate(invalid="ignore"):
+        return Signals(
+            start=max(ema, 16) - 1,
+            long_entry=(cross > 0) & (close > trend),
+            short_entry=(cross < 0) & (close < trend),
+            long_stop=long_stop,
+            short_stop=short_stop,
+        )
+
+
+def dmi_crossover(arrays, ema=200, long_stoploss=None, buy_price=None):
+    close = numpy.asarray(arrays["close"], dtype=numpy.float64)
+    trend = smoothing(close, ema, 0, 2.0 / (1.0 + ema))
+    plus_di, minus_di = directional_indicator(arrays["high"], arrays["low"],
+                                              close)
+    cross = crossover(plus_di, minus_di, 14)
+    long_stop, short_stop = _swing_stops(arrays)
+
+    with numpy.errstate(invalid="ignore"):
+        return Signals(
+            # the DMI's ADX line needs the longest warm-up
+            start=max(ema, 28) - 1,
+            long_entry=(cross > 0) & (close > trend),
+            short_entry=(cross < 0) & (close < trend),
+            long_stop=long_stop,
+            short_stop=short_stop,
+        )
+
+
+STRATEGIES = {
+    "EmaCrossOver": ema_crossover,
+    "MacdCrossOver": macd_crossover,
+    "RsiCrossOver": rsi_crossover,
+    "DmiCrossOver": dmi_crossover,
+}
+
+
+def simulate(arrays, signals, commission=COMMISSION):
+    """Trades of a crossover strategy given its precomputed signals.
+
+    Reproduces the strategies' order flow with a size 1 position and the
+    broker's percentage commission, without running Cerebro.
+    """
+    open_ = numpy.asarray(arrays["open"], dtype=numpy.float64)
+    close = numpy.asarray(arrays["close"], dtype=numpy.float64)
+    buffers = [
+        open_, close, signals.long_entry, signals.short_entry,
+        signals.long_stop, signals.short_stop
+    ]
+
+    # at most one trade every two bars
+    size = len(close) // 2 + 1
+    side = numpy.zeros(size, dtype=numpy.int64)
+    entry = numpy.zeros(size, dtype=numpy.int64)
+    exit_ = numpy.full(size, -1, dtype=numpy.int64)
+    entry_price = numpy.full(size, numpy.nan)
+    exit_price = numpy.full(size, numpy.nan)
+    outputs = [side, entry, exit_, entry_price, exit_price]
+
+    kernel = _compiled.get(_simulate)
+    if kernel is not None:
+        count = kernel(*(buffers[:6] + [commission, signals.start] + outputs))
+    else:
+        lists = [numpy.asarray(b).tolist() for b in buffers]
+        outputs = [o.tolist() for o in outputs]
+        count = _simulate(*(lists + [commission, signals.start] + outputs))
+        side, entry, exit_, entry_price, exit_price = (numpy.array(o)
+                                                       for o in outputs)
+
+    side, entry, exit_ = side[:count], entry[:count], exit_[:count]
+    entry_price, exit_price = entry_price[:count], exit_price[:count]
+    pnl = side * (exit_price - entry_price)
+    pnlcomm = pnl - (entry_price * commission + exit_price * commission)
+
+    trades = []
+    for i in range(count):
+        closed = exit_[i] >= 0
+        trades.append(
+            Trade(
+                long=bool(side[i] > 0),
+                entry=int(entry[i]),
+                exit=int(exit_[i]),
+                entry_price=float(entry_price[i]),
+                exit_price=float(exit_price[i]),
+                pnl=float(pnl[i]) if closed else None,
+                pnlcomm=float(pnlcomm[i]) if closed else None,
+            ))
+    return trades
+
+
+def _datetime(ts):
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=int(ts))
+
+
+def backtest(strategy,
+             arrays,
+             params=None,
+             cash=CASH,
+             commission=COMMISSION):
+    """Fast-path counterpart of ``engine.runner.backtest``.
+
+    ``strategy`` is a signal function or a name in ``STRATEGIES``. Returns
+    the trades and a row shaped like ``engine.runner.summarize``: broker
+    value, pnl and the flattened ``BasicTradeStats`` figures.
+    """
+    signals = STRATEGIES.get(strategy, strategy)(arrays, **(params or {}))
+    trades = simulate(arrays, signals, commission)
+
+    # broker value: realized trades plus the open position at the last close
+    value = cash + math.fsum(t.pnlcomm for t in trades if t.exit >= 0)
+    if trades and trades[-1].exit < 0:
+        t = trades[-1]
+        last = float(arrays["close"][-1])
+        value += ((last - t.entry_price) * (1 if t.long else -1) -
+                  t.entry_price * commission)
+
+    row = dict(value=value, pnl=value - cash)
+    if len(arrays["ts"]) > signals.start:
+        analysis = TradeStats().run(trades,
+                                    _datetime(arrays["ts"][signals.start]),
+                                    _datetime(arrays["ts"][-1]))
+        row.update(flatten(analysis))
+    return trades, row
+
+
+def screen(strategy,
+           path,
+           space,
+           stock_ids=None,
+           n=None,
+           seed=0,
+           session=SESSION,
+           start=None,
+           end=None,
+           timeframe=None,
+           compact=False,
+           tick=None,
+           cash=CASH,
+           commission=COMMISSION,
+           directory=CACHE_DIRECTORY,
+           validate=False):
+    """``engine.optimize.optimize`` on the fast path.
+
+    Same arguments and table, so ``engine.optimize.rank`` applies; confirm
+    the winners with full Cerebro runs.
+    """
+    if validate:
+        stock_ids = passing(path, stock_ids, session=session)
+    arrays = BarCache(directory).arrays(path,
+                                        stock_ids,
+                                        session=session,
+                                        start=start,
+                                        end=end,
+                                        timeframe=timeframe,
+                                        compact=compact,
+                                        tick=tick)
+    if tick is not None:
+        # the signals are float indicators; only the rounding to the grid
+        # carries over
+        arrays = {s: from_ticks(c, tick) for s, c in arrays.items()}
+    combinations = list(grid(space) if n is None else sample(space, n, seed))
+
+    rows = []
+    for params in combinations:
+        for stock_id, columns in arrays.items():
+            _, summary = backtest(strategy, columns, params, cash, commission)
+            row = dict(params, stock_id=stock_id)
+            row.update(summary)
+            rows.append(row)
+    return pandas.DataFrame(rows)
@@ -1,8 +1,11 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import logging
 import backtrader
-import pandas
-import sqlite3
 from analyzers.trade_statistics import BasicTradeStats
+from engine.logger import configure, logger
+from feeds.numpy_feed import NumpyData
+from store.prefetch import prefetch
 
 
 class EngulfingPattern(backtrader.Strategy):
@@ -20,11 +23,14 @@ class EngulfingPattern(backtrader.Strategy):
         self.short_target = 0
         self.ema = backtrader.indicators.EMA(period=self.p.ema, plot=True)
 
-    def log(self, txt, dt=None):
+    def log(self, txt, dt=None, level=logging.INFO):
+        if not logger.isEnabledFor(level):
+            return
+
         if dt is None:
             dt = self.datas[0].datetime.datetime()
 
-        print("%s, %s" % (dt, txt))
+        logger.log(level, "%s, %s", dt, txt)
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -46,7 +52,7 @@ class EngulfingPattern(backtrader.Strategy):
                 self.log(f"*** SELL EXECUTED, Price: {order_details} ***")
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log("Order Canceled/Margin/Rejected")
+            self.log("Order Canceled/Margin/Rejected", level=logging.WARNING)
 
         self.order = None
 
@@ -129,39 +135,23 @@ class EngulfingPattern(backtrader.Strategy):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless",
+                        action="store_true",
+                        help="no plots, only warnings are logged")
+    args = parser.parse_args()
+    configure(headless=args.headless)
+
     database_path_fifteen_minute = "./databases/app-minute-fifteen.db"
-    conn = sqlite3.connect(database_path_fifteen_minute)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(stock_id) as stock_id FROM stock_price_minute
-    """)
-
-    stocks = cursor.fetchall()
-    for stock in stocks:
-        print(f"*** Testing {stock['stock_id']} ***")
+    for stock_id, arrays in prefetch(database_path_fifteen_minute):
+        print(f"*** Testing {stock_id} ***")
         cerebro = backtrader.Cerebro()
         cerebro.broker.setcash(100000.0)
         cerebro.broker.setcommission(commission=0.010)
 
         # cerebro.addsizer(backtrader.sizers.PercentSizer, percents=50)
 
-        dataframe = pandas.read_sql(
-            """
-            select datetime, open, high, low, close, volume
-            from stock_price_minute
-            where stock_id = :stock_id
-            and strftime('%H:%M:%S', datetime) >= '09:30:00' 
-            and strftime('%H:%M:%S', datetime) < '16:00:00'
-            order by datetime asc
-        """,
-            conn,
-            params={"stock_id": stock["stock_id"]},
-            index_col="datetime",
-            parse_dates=["datetime"],
-        )
-
-        data = backtrader.feeds.PandasData(dataname=dataframe)
+        data = NumpyData(dataname=arrays)
         cerebro.adddata(data)
         cerebro.addstrategy(EngulfingPattern)
 
@@ -173,4 +163,5 @@ if __name__ == "__main__":
         s = ss
         for each in ss.analyzers:
             each.print()
-        cerebro.plot(style="candlestick")
+        if not args.headless:
+            cerebro.plot(style="candlestick")
@@ -0,0 +1,161 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import array
+
+import backtrader
+import numpy
+
+from store.calendar import session_calendar
+from store.compact import PRICES
+
+# backtrader's datetime line counts days from 0001-01-01 (date2num)
+EPOCH_ORDINAL = 719163.0
+
+LINES = ["open", "high", "low", "close", "volume"]
+CALENDAR = ["minute_of_day", "bar_of_day", "bars_left"]
+
+# subclasses made by with_lines(), by line names
+_feeds = {}
+
+
+def _two_sum(a, b):
+    s = a + b
+    bb = s - a
+    return s, (a - (s - bb)) + (b - bb)
+
+
+def date2num(ts):
+    # vectorized backtrader.date2num for naive epoch seconds; date2num
+    # fsum()s the day ordinal and the hour/minute/second fractions, so the
+    # same terms are summed here in double-double to round identically
+    ts = numpy.asarray(ts, dtype=numpy.int64)
+    days, seconds = numpy.divmod(ts, 86400)
+
+    hi = days.astype(numpy.float64) + EPOCH_ORDINAL
+    lo = numpy.zeros_like(hi)
+    for term in (seconds // 3600 / 24.0, seconds // 60 % 60 / 1440.0,
+                 seconds % 60 / 86400.0):
+        hi, err = _two_sum(hi, term)
+        lo += err
+
+    return hi + lo
+
+
+class NumpyData(backtrader.feed.DataBase):
+    """Data feed over per-column NumPy arrays.
+
+    ``dataname`` is a mapping with ``ts`` (epoch seconds) and the OHLCV
+    columns, e.g. the memory-mapped arrays handed out by
+    ``store.cache.BarCache.arrays``. Preloading copies each column into the
+    line buffers in one bulk operation instead of one bar at a time.
+
+    The ``store.calendar.session_calendar`` of the bars comes along as the
+    ``minute_of_day``, ``bar_of_day`` and ``bars_left`` lines, so strategies
+    can spot a day's first or last bar without building datetimes.
+
+    float32 price columns (``store.compact``) are kept as float32 in the
+    line buffers. Integer tick prices (``store.ticks``) are scaled back by
+    the ``tick`` param, so equal tick counts give exactly equal prices;
+    without it the lines count ticks.
+
+    Any further lines a subclass declares (see ``with_lines``) are filled
+    from the ``dataname`` columns of the same name.
+    """
+    lines = tuple(CALENDAR)
+    params = (("tick", None), )
+
+    def start(self):
+        super(NumpyData, self).start()
+        self._attach(self.p.dataname)
+
+    def _attach(self, columns):
+        self._idx = -1
+        self._columns = columns
+        self._datetime = date2num(columns["ts"])
+        self.calendar = session_calendar(columns["ts"])
+        builtin = ["datetime", "openinterest"] + LINES + CALENDAR
+        self._extra = [
+            name for name in self.lines.getlinealiases()
+            if name not in builtin and name in columns
+        ]
+
+    def preload(self):
+        # filters and input timezones work bar by bar: take the slow path
+        if self._filters or self._ffilters or self._tzinput:
+            return super(NumpyData, self).preload()
+
+        dt = self._datetime
+        keep = (dt >= self.fromdate) & (dt <= self.todate)
+        if keep.all():
+            keep = slice(None)
+
+        self._extend(self.lines.datetime, dt[keep])
+        for name in LINES:
+            line = getattr(self.lines, name)
+            self._extend(line, self._values(name, keep))
+        for name in CALENDAR:
+            line = getattr(self.lines, name)
+            self._extend(line, self.calendar[name][keep])
+        for name in self._extra:
+            line = getattr(self.lines, name)
+            self._extend(line, numpy.asarray(self._columns[name])[keep])
+
+        self._extend(self.lines.openinterest,
+                     numpy.full(len(dt[keep]), numpy.nan))
+
+        self._idx = len(dt)
+        self._last()
+        self.home()
+
+    def _values(self, name, index):
+        values = self._columns[name][index]
+        if self.p.tick is not None and name in PRICES:
+            values = values * self.p.tick
+        return values
+
+    def _extend(self, line, values):
+        if isinstance(line.array, array.array):
+            # compact float32 prices stay 4 bytes a bar in the line buffer
+            if (not len(line.array)
+                    and numpy.asarray(values).dtype == numpy.float32):
+                line.array = array.array(str("f"))
+            dtype = {"f": numpy.float32}.get(line.array.typecode,
+                                             numpy.float64)
+            values = numpy.ascontiguousarray(values, dtype=dtype)
+            line.array.frombytes(memoryview(values).cast("B"))
+        else:
+            values = numpy.asarray(values, dtype=numpy.float64)
+            line.array.extend(values.tolist())
+
+        line.idx += len(values)
+        line.lencount += len(values)
+
+    def _load(self):
+        self._idx += 1
+
+        if self._idx >= len(self._datetime):
+            return False
+
+        self.lines.datetime[0] = self._datetime[self._idx]
+        for name in LINES:
+            getattr(self.lines, name)[0] = self._values(name, self._idx)
+        for name in CALENDAR:
+            getattr(self.lines, name)[0] = self.calendar[name][self._idx]
+        for name in self._extra:
+            getattr(self.lines, name)[0] = self._columns[name][self._idx]
+
+        return True
+
+
+def with_lines(*names):
+    """NumpyData subclass with extra ``names`` lines.
+
+    They are filled from the columns of the same name, e.g. precomputed
+    ``indicators.higher_timeframe`` series.
+    """
+    feed = _feeds.get(names)
+    if feed is None:
+        feed = _feeds[names] = type(str("NumpyData_" + "_".join(names)),
+                                    (NumpyData, ), {"lines": names})
+    return feed
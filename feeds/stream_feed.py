@@ -0,0 +1,63 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import backtrader
+
+from feeds.numpy_feed import NumpyData
+from store.db import connection
+from store.loader import iter_chunks
+from store.schema import SESSION
+
+
+class StreamData(NumpyData):
+    """One symbol streamed from the price database in chunks of whole days.
+
+    ``dataname`` is the database path. Only the current chunk is held, so
+    with ``Cerebro(preload=False, runonce=False, exactbars=1)``, which keeps
+    just the lookback the indicators need in the line buffers, memory stays
+    flat however long the history is. backtrader sizes those buffers by
+    minimum period only: an indicator whose ``next`` reads its own earlier
+    values has to reserve them (``minbuffer`` in ``qbuffer``, as
+    ``indicators.supertrend`` does) or it silently sees stale ones.
+    """
+    params = (
+        ("stock_id", None),
+        ("session", SESSION),
+        ("start", None),
+        ("end", None),
+        ("chunksize", 100000),
+        ("compact", False),
+    )
+
+    def start(self):
+        # NumpyData.start expects the arrays in dataname
+        super(NumpyData, self).start()
+        self._chunks = iter_chunks(connection(self.p.dataname),
+                                   self.p.stock_id,
+                                   session=self.p.session,
+                                   start=self.p.start,
+                                   end=self.p.end,
+                                   chunksize=self.p.chunksize,
+                                   compact=self.p.compact,
+                                   tick=self.p.tick)
+        self._attach(self._empty())
+
+    def stop(self):
+        self._chunks.close()
+        super(StreamData, self).stop()
+
+    def preload(self):
+        # bar by bar through _load, NumpyData's bulk copy needs every bar
+        return backtrader.feed.DataBase.preload(self)
+
+    def _load(self):
+        while self._idx + 1 >= len(self._datetime):
+            columns = next(self._chunks, None)
+            if columns is None:
+                return False
+            self._attach(columns)
+
+        return super(StreamData, self)._load()
+
+    def _empty(self):
+        return {"ts": ()}
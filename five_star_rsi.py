@@ -1,8 +1,16 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import logging
 import backtrader
-import pandas
-import sqlite3
+from datetime import date
 from analyzers.trade_statistics import BasicTradeStats
+from engine.logger import configure, logger
+from engine.vectorized import rsi
+from feeds.numpy_feed import with_lines
+from indicators.higher_timeframe import higher_timeframe
+from store.cache import BarCache
+from store.prefetch import prefetch
+from store.resample import MONTHLY, WEEKLY
 
 
 class FiveStarRSI(backtrader.Strategy):
@@ -20,23 +28,32 @@ class FiveStarRSI(backtrader.Strategy):
                                              lowerband=40,
                                              plot=True)
 
-        self.rsi_weekly = backtrader.indicators.RSI(self.data,
-                                                    period=7,
-                                                    upperband=60,
-                                                    lowerband=40,
-                                                    plot=True)
-                                                    
-        self.rsi_monthly = backtrader.indicators.RSI(self.data,
-                                                     period=30,
-                                                     upperband=60,
-                                                     lowerband=40,
-                                                     plot=True)
-
-    def log(self, txt, dt=None):
+        if hasattr(self.data.lines, "rsi_weekly"):
+            # RSI(14) of weekly and monthly bars (higher_timeframe lines)
+            self.rsi_weekly = self.data.rsi_weekly
+            self.rsi_monthly = self.data.rsi_monthly
+        else:
+            # approximated on the daily bars
+            self.rsi_weekly = backtrader.indicators.RSI(self.data,
+                                                        period=7,
+                                                        upperband=60,
+                                                        lowerband=40,
+                                                        plot=True)
+
+            self.rsi_monthly = backtrader.indicators.RSI(self.data,
+                                                         period=30,
+                                                         upperband=60,
+                                                         lowerband=40,
+                                                         plot=True)
+
+    def log(self, txt, dt=None, level=logging.INFO):
+        if not logger.isEnabledFor(level):
+            return
+
         if dt is None:
             dt = self.datas[0].datetime.datetime()
 
-        print("%s, %s" % (dt, txt))
+        logger.log(level, "%s, %s", dt, txt)
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -52,7 +69,7 @@ class FiveStarRSI(backtrader.Strategy):
                 self.log(f"*** SELL EXECUTED, Price: {order_details} ***")
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log("Order Canceled/Margin/Rejected")
+            self.log("Order Canceled/Margin/Rejected", level=logging.WARNING)
 
         self.order = None
 
@@ -128,39 +145,36 @@ class FiveStarRSI(backtrader.Strategy):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless",
+                        action="store_true",
+                        help="no plots, only warnings are logged")
+    args = parser.parse_args()
+    configure(headless=args.headless)
+
     database_path_daily = "./databases/app-daily.db"
-    conn = sqlite3.connect(database_path_daily)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(stock_id) as stock_id FROM stock_price_minute
-    """)
-
-    stocks = cursor.fetchall()
-    for stock in stocks:
-        print(f"*** Testing {stock['stock_id']} ***")
+    # the weekly and monthly RSI warm up on the full history
+    history = BarCache().arrays(database_path_daily, session=None)
+    for stock_id, arrays in prefetch(database_path_daily,
+                                     session=None,
+                                     start=date(2020, 1, 1),
+                                     end=date(2021, 12, 31)):
+        print(f"*** Testing {stock_id} ***")
         cerebro = backtrader.Cerebro()
         cerebro.broker.setcash(100000.0)
         cerebro.broker.setcommission(commission=0.010)
 
         # cerebro.addsizer(backtrader.sizers.PercentSizer, percents=50)
 
-        dataframe = pandas.read_sql(
-            """
-            select datetime, open, high, low, close, volume
-            from stock_price_minute
-            where stock_id = :stock_id
-            and strftime('%Y-%m-%d', datetime) >= '2020-01-01' 
-            and strftime('%Y-%m-%d', datetime) < '2021-12-31'
-            order by datetime asc
-        """,
-            conn,
-            params={"stock_id": stock["stock_id"]},
-            index_col="datetime",
-            parse_dates=["datetime"],
-        )
-
-        data = backtrader.feeds.PandasData(dataname=dataframe)
+        columns = dict(arrays)
+        for name, timeframe in (("rsi_weekly", WEEKLY),
+                                ("rsi_monthly", MONTHLY)):
+            columns[name] = higher_timeframe(arrays,
+                                             timeframe,
+                                             rsi,
+                                             history=history[stock_id],
+                                             period=14)
+        data = with_lines("rsi_weekly", "rsi_monthly")(dataname=columns)
         cerebro.adddata(data)
         cerebro.addstrategy(FiveStarRSI)
 
@@ -172,4 +186,5 @@ if __name__ == "__main__":
         s = ss
         for each in ss.analyzers:
             each.print()
-        cerebro.plot(style="candlestick")
+        if not args.headless:
+            cerebro.plot(style="candlestick")
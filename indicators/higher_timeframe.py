@@ -0,0 +1,40 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy
+
+from store.resample import buckets, resample
+
+
+def aligned(ts, timeframe, higher_ts, values):
+    """``values`` of ``timeframe`` bars (labelled ``higher_ts``) per bar of
+    ``ts``, without lookahead.
+
+    A bar sees the value of the last higher bar that had completed before
+    its own bucket began, i.e. a daily bar gets last week's weekly RSI,
+    never the week still in progress. NaN until one has completed.
+    """
+    values = numpy.concatenate([[numpy.nan], values])
+    current = numpy.searchsorted(higher_ts, buckets(ts, timeframe))
+    return values[current]
+
+
+def higher_timeframe(arrays,
+                     timeframe,
+                     indicator,
+                     field="close",
+                     history=None,
+                     **params):
+    """``indicator`` computed on ``timeframe`` bars, aligned to ``arrays``.
+
+    ``indicator(values, **params)`` takes one field of the resampled bars
+    and returns an array as long, e.g. ``engine.vectorized.rsi``; the
+    result lines up with ``arrays`` bar for bar (see ``aligned``).
+    ``history`` (the same symbol's bars over a longer span, such as the
+    whole store) is resampled instead of ``arrays`` so the indicator is
+    warmed up when the backtest window starts.
+    """
+    bars = resample(arrays if history is None else history, timeframe)
+    values = numpy.asarray(indicator(bars[field], **params),
+                           dtype=numpy.float64)
+    return aligned(arrays["ts"], timeframe, bars["ts"], values)
@@ -1,7 +1,149 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import math
+
 import backtrader
+import numpy
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+# The recursive parts of the SuperTrend run as plain loops over buffers:
+# backtrader's array.array line buffers in once() mode, lists or NumPy arrays
+# for supertrend(). With numba installed they are compiled for NumPy input.
+def _smooth(tr, atr, period, start, end):
+    # SmoothedMovingAverage as backtrader computes it: the mean of the first
+    # `period` values as seed, then prev * (1 - alpha) + value * alpha
+    alpha = 1.0 / period
+    alpha1 = 1.0 - alpha
+    prev = atr[start - 1]
+    for i in range(start, end):
+        prev = prev * alpha1 + tr[i] * alpha
+        atr[i] = prev
+
+
+def _final_bands(basic_ub, basic_lb, close, final_ub, final_lb, first, start,
+                 end):
+    for i in range(start, end):
+        if i == first:
+            final_ub[i] = basic_ub[i]
+            final_lb[i] = basic_lb[i]
+            continue
+
+        #=IF(OR(basic_ub<final_ub*,close*>final_ub*),basic_ub,final_ub*)
+        if basic_ub[i] < final_ub[i - 1] or close[i - 1] > final_ub[i - 1]:
+            final_ub[i] = basic_ub[i]
+        else:
+            final_ub[i] = final_ub[i - 1]
+
+        #=IF(OR(baisc_lb > final_lb *, close * < final_lb *), basic_lb *, final_lb *)
+        if basic_lb[i] > final_lb[i - 1] or close[i - 1] < final_lb[i - 1]:
+            final_lb[i] = basic_lb[i]
+        else:
+            final_lb[i] = final_lb[i - 1]
+
+
+def _trend(final_ub, final_lb, close, trend, first, start, end):
+    for i in range(start, end):
+        if i == first:
+            trend[i] = final_ub[i]
+            continue
+
+        if trend[i - 1] == final_ub[i - 1]:
+            if close[i] <= final_ub[i]:
+                trend[i] = final_ub[i]
+            else:
+                trend[i] = final_lb[i]
+
+        if trend[i - 1] == final_lb[i - 1]:
+            if close[i] >= final_lb[i]:
+                trend[i] = final_lb[i]
+            else:
+                trend[i] = final_ub[i]
+
+
+if njit is not None:
+    _compiled = {
+        kernel: njit(cache=True)(kernel)
+        for kernel in (_smooth, _final_bands, _trend)
+    }
+else:
+    _compiled = {}
+
+
+def _run(kernel, arrays, *args):
+    # arrays are float64 buffers, updated in place; a data line may be a
+    # float32 buffer (store.compact), viewed with its own typecode
+    compiled = _compiled.get(kernel)
+    if compiled is not None:
+        views = [
+            numpy.frombuffer(a, dtype=getattr(a, "typecode", numpy.float64))
+            for a in arrays
+        ]
+        compiled(*(views + list(args)))
+    else:
+        kernel(*(list(arrays) + list(args)))
+
+
+def average_true_range(high, low, close, period=7):
+    high, low, close = (numpy.asarray(a, dtype=numpy.float64)
+                        for a in (high, low, close))
+    atr = numpy.full(len(close), numpy.nan)
+    if len(close) <= period:
+        return atr
+
+    tr = numpy.full(len(close), numpy.nan)
+    tr[1:] = (numpy.maximum(high[1:], close[:-1]) -
+              numpy.minimum(low[1:], close[:-1]))
+    atr[period] = math.fsum(tr[1:period + 1]) / period
+
+    if _compiled:
+        _run(_smooth, [tr, atr], period, period + 1, len(close))
+        return atr
+
+    tr, atr = tr.tolist(), atr.tolist()
+    _smooth(tr, atr, period, period + 1, len(close))
+    return numpy.array(atr)
+
+
+def supertrend(high, low, close, period=7, multiplier=3):
+    """Whole-series SuperTrend in one pass.
+
+    Returns ``(final_ub, final_lb, super_trend)`` arrays, NaN before bar
+    ``period``, matching the ``SuperTrendBand``/``SuperTrend`` indicators
+    bar for bar.
+    """
+    high, low, close = (numpy.asarray(a, dtype=numpy.float64)
+                        for a in (high, low, close))
+    atr = average_true_range(high, low, close, period)
+    basic_ub = ((high + low) / 2) + (atr * multiplier)
+    basic_lb = ((high + low) / 2) - (atr * multiplier)
+
+    n = len(close)
+    final_ub = numpy.full(n, numpy.nan)
+    final_lb = numpy.full(n, numpy.nan)
+    trend = numpy.full(n, numpy.nan)
+    if n <= period:
+        return final_ub, final_lb, trend
+
+    if _compiled:
+        _run(_final_bands, [basic_ub, basic_lb, close, final_ub, final_lb],
+             period, period, n)
+        _run(_trend, [final_ub, final_lb, close, trend], period, period, n)
+        return final_ub, final_lb, trend
+
+    buffers = [a.tolist() for a in (basic_ub, basic_lb, close, final_ub,
+                                    final_lb, trend)]
+    basic_ub, basic_lb, close, final_ub, final_lb, trend = buffers
+    _final_bands(basic_ub, basic_lb, close, final_ub, final_lb, period,
+                 period, n)
+    _trend(final_ub, final_lb, close, trend, period, period, n)
+    return (numpy.array(final_ub), numpy.array(final_lb),
+            numpy.array(trend))
 
 
 class SuperTrendBand(backtrader.Indicator):
@@ -34,6 +176,19 @@ class SuperTrendBand(backtrader.Indicator):
             else:
                 self.l.final_lb[0] = self.l.final_lb[-1]
 
+    def qbuffer(self, savemem=0):
+        # with exactbars next() still needs the previous bands
+        super(SuperTrendBand, self).qbuffer(savemem=savemem)
+        self.l.final_ub.minbuffer(2)
+        self.l.final_lb.minbuffer(2)
+
+    def once(self, start, end):
+        _run(_final_bands, [
+            self.l.basic_ub.array, self.l.basic_lb.array,
+            self.data.close.array, self.l.final_ub.array,
+            self.l.final_lb.array
+        ], self.p.period, start, end)
+
 
 class SuperTrend(backtrader.Indicator):
     params = (('period', 7), ('multiplier', 3))
@@ -60,3 +215,14 @@ class SuperTrend(backtrader.Indicator):
                 self.l.super_trend[0] = self.stb.final_lb[0]
             else:
                 self.l.super_trend[0] = self.stb.final_ub[0]
+
+    def qbuffer(self, savemem=0):
+        # with exactbars next() still needs the previous trend
+        super(SuperTrend, self).qbuffer(savemem=savemem)
+        self.l.super_trend.minbuffer(2)
+
+    def once(self, start, end):
+        _run(_trend, [
+            self.stb.final_ub.array, self.stb.final_lb.array,
+            self.data.close.array, self.l.super_trend.array
+        ], self.p.period, start, end)
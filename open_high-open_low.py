@@ -1,9 +1,13 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import logging
 import backtrader
-import pandas
-import sqlite3
 from datetime import time
 from analyzers.trade_statistics import BasicTradeStats
+from engine.logger import configure, logger
+from feeds.numpy_feed import NumpyData
+from store.prefetch import prefetch
+from store.schema import to_minute
 
 
 class OpenHigh_OpenLow(backtrader.Strategy):
@@ -22,13 +26,20 @@ class OpenHigh_OpenLow(backtrader.Strategy):
         self.opening_range_low = 0
         self.opening_range_high = 0
         self.opening_range = 0
+        self.opening_range_time = time(9, 00, 0)
+        self.opening_range_start = to_minute(self.opening_range_time)
+        # NumpyData's session calendar; other feeds go through num2date
+        self.calendar = hasattr(self.data.lines, "minute_of_day")
         self.ema = backtrader.indicators.EMA(period=self.p.ema, plot=True)
 
-    def log(self, txt, dt=None):
+    def log(self, txt, dt=None, level=logging.INFO):
+        if not logger.isEnabledFor(level):
+            return
+
         if dt is None:
             dt = self.datas[0].datetime.datetime()
 
-        print("%s, %s" % (dt, txt))
+        logger.log(level, "%s, %s", dt, txt)
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -50,15 +61,19 @@ class OpenHigh_OpenLow(backtrader.Strategy):
                 self.log(f"*** SELL EXECUTED: {order_details} ***")
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log("Order Canceled/Margin/Rejected")
+            self.log("Order Canceled/Margin/Rejected", level=logging.WARNING)
 
         self.order = None
 
-    def next(self):
+    def opening(self):
+        if self.calendar:
+            return self.data.minute_of_day[0] <= self.opening_range_start
+
         current_bar_datetime = self.data.num2date(self.data.datetime[0])
-        opening_range_start_time = time(9, 00, 0)
+        return current_bar_datetime.time() <= self.opening_range_time
 
-        if current_bar_datetime.time() <= opening_range_start_time:
+    def next(self):
+        if self.opening():
             pass  # skipping trade before 9:15:00
 
         else:
@@ -139,47 +154,32 @@ class OpenHigh_OpenLow(backtrader.Strategy):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless",
+                        action="store_true",
+                        help="no plots, only warnings are logged")
+    args = parser.parse_args()
+    configure(headless=args.headless)
+
     database_path_one_minute = "./databases/app-minute-one.db"
     database_path_fifteen_minute = "./databases/app-minute-fifteen.db"
     database_path_crypto = "./databases/crypto-data.db"
     database_path_five_minute = "./databases/app-minute-five.db"
 
-    # conn = sqlite3.connect(database_path_one_minute)
-    conn = sqlite3.connect(database_path_fifteen_minute)
-    # conn = sqlite3.connect(database_path_crypto)
-    # conn = sqlite3.connect(database_path_five_minute)
-
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(stock_id) as stock_id FROM stock_price_minute
-    """)
+    # database_path = database_path_one_minute
+    database_path = database_path_fifteen_minute
+    # database_path = database_path_crypto
+    # database_path = database_path_five_minute
 
-    stocks = cursor.fetchall()
-    for stock in stocks:
-        print(f"*** Testing {stock['stock_id']} ***")
+    for stock_id, arrays in prefetch(database_path):
+        print(f"*** Testing {stock_id} ***")
         cerebro = backtrader.Cerebro()
         cerebro.broker.setcash(100000.0)
         cerebro.broker.setcommission(commission=0.010)
 
         # cerebro.addsizer(backtrader.sizers.PercentSizer, percents=95)
 
-        dataframe = pandas.read_sql(
-            """
-            select datetime, open, high, low, close, volume
-            from stock_price_minute
-            where stock_id = :stock_id
-            and strftime('%H:%M:%S', datetime) >= '09:30:00' 
-            and strftime('%H:%M:%S', datetime) < '16:00:00'
-            order by datetime asc
-        """,
-            conn,
-            params={"stock_id": stock["stock_id"]},
-            index_col="datetime",
-            parse_dates=["datetime"],
-        )
-
-        data = backtrader.feeds.PandasData(dataname=dataframe)
+        data = NumpyData(dataname=arrays)
         cerebro.adddata(data)
         cerebro.addstrategy(OpenHigh_OpenLow)
 
@@ -190,4 +190,5 @@ if __name__ == "__main__":
         s = ss
         for each in ss.analyzers:
             each.print()
-        cerebro.plot(style="candlestick")
+        if not args.headless:
+            cerebro.plot(style="candlestick")
@@ -0,0 +1,241 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import calendar
+import collections
+import csv
+import datetime
+import socket
+import time
+
+import numpy
+
+from store.ingest import BATCH_SIZE, UPSERT, connect, stock_id, to_rows
+from store.loader import COLUMNS
+
+TIME = "time"
+VOLUME = "volume"
+TICKS = "ticks"
+
+# trade prints: symbol,datetime,price,volume (datetime as text or epoch)
+TICK_COLUMNS = ["symbol", "datetime", "price", "volume"]
+
+# longest a completed bar waits for its batch, so readers see live bars
+INTERVAL = 1.0
+
+
+def to_seconds(value):
+    try:
+        return float(value)
+    except ValueError:
+        moment = datetime.datetime.fromisoformat(value)
+        return (calendar.timegm(moment.timetuple()) +
+                moment.microsecond / 1e6)
+
+
+class BarAggregator(object):
+    """One symbol's bars built tick by tick.
+
+    ``kind`` TIME closes a bar every ``size`` minutes (labelled with the
+    start of its bucket, like ``store.resample``), VOLUME once it holds
+    ``size`` volume (a large print is not split, the bar just ends up
+    bigger) and TICKS after ``size`` prints. VOLUME and TICKS bars are
+    labelled with the second of their first print, moved one second past
+    the previous bar when they would share it, as stored bars need a
+    unique timestamp.
+
+    ``update`` is O(1) and returns the bar a tick completed, if any, as a
+    (ts, open, high, low, close, volume) tuple. A tick older than the time
+    bar in progress is dropped and counted in ``late``.
+    """
+
+    def __init__(self, kind=TIME, size=1):
+        if kind not in (TIME, VOLUME, TICKS):
+            raise ValueError(f"unknown bar kind {kind!r}")
+
+        self.kind = kind
+        self.size = size
+        self.width = int(size * 60)
+        self.late = 0
+        self._bar = None
+        self._last = None
+
+    def update(self, ts, price, volume):
+        bar = self._bar
+        done = None
+
+        if self.kind == TIME:
+            label = int(ts) // self.width * self.width
+            if bar is not None and label != bar[0]:
+                if label < bar[0]:
+                    self.late += 1
+                    return None
+                done = self.flush()
+                bar = None
+        elif bar is None:
+            label = int(ts)
+            if self._last is not None and label <= self._last:
+                label = self._last + 1
+
+        if bar is None:
+            bar = self._bar = [label, price, price, price, price, 0, 0]
+
+        if price > bar[2]:
+            bar[2] = price
+        elif price < bar[3]:
+            bar[3] = price
+        bar[4] = price
+        bar[5] += volume
+        bar[6] += 1
+
+        if ((self.kind == VOLUME and bar[5] >= self.size)
+                or (self.kind == TICKS and bar[6] >= self.size)):
+            return self.flush()
+        return done
+
+    def flush(self):
+        # the bar in progress, complete or not
+        bar = self._bar
+        if bar is None:
+            return None
+
+        self._bar = None
+        self._last = bar[0]
+        return tuple(bar[:6])
+
+
+def read_ticks(filename):
+    with open(filename, newline="") as f:
+        rows = csv.reader(f)
+        header = next(rows)
+        index = [header.index(name) for name in TICK_COLUMNS]
+        for row in rows:
+            symbol, moment, price, volume = (row[i] for i in index)
+            yield symbol, to_seconds(moment), float(price), float(volume)
+
+
+def socket_ticks(address):
+    """Ticks read from a local socket until the sender closes it.
+
+    ``address`` is ``host:port`` or the path of a unix socket; lines are
+    ``symbol,datetime,price,volume`` without a header.
+    """
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+        sock = socket.create_connection((host, int(port)))
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+
+    with sock, sock.makefile("r", newline="") as lines:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            symbol, moment, price, volume = line.split(",")
+            yield symbol, to_seconds(moment), float(price), float(volume)
+
+
+def _write(conn, ids, pending):
+    # every symbol's completed bars in one transaction
+    with conn:
+        for symbol, bars in pending.items():
+            arrays = dict(zip(["ts"] + COLUMNS, map(numpy.array, zip(*bars))))
+            conn.executemany(UPSERT, to_rows(ids[symbol], arrays))
+    written = sum(len(bars) for bars in pending.values())
+    pending.clear()
+    return written
+
+
+def aggregate(path,
+              ticks,
+              kind=TIME,
+              size=1,
+              batch_size=BATCH_SIZE,
+              interval=INTERVAL):
+    """Bars from ``(symbol, seconds, price, volume)`` ticks into ``path``.
+
+    Completed bars are upserted in batches of ``batch_size``, or sooner once
+    ``interval`` seconds have passed, so a live feed shows up in the store
+    while it runs. The bars still in progress are written when the ticks
+    run out (or the loop is interrupted); a later run picking up mid-bar
+    replaces that bar rather than merging into it. Returns tick and bar
+    counts, elapsed seconds and ticks per second.
+    """
+    conn = connect(path)
+    builders = {}
+    ids = {}
+    pending = collections.defaultdict(list)
+    count = bars = waiting = 0
+
+    started = flushed = time.perf_counter()
+    try:
+        for symbol, ts, price, volume in ticks:
+            builder = builders.get(symbol)
+            if builder is None:
+                builder = builders[symbol] = BarAggregator(kind, size)
+                ids[symbol] = stock_id(conn, symbol)
+
+            count += 1
+            bar = builder.update(ts, price, volume)
+            if bar is None:
+                continue
+
+            pending[symbol].append(bar)
+            waiting += 1
+            if (waiting >= batch_size
+                    or time.perf_counter() - flushed >= interval):
+                bars += _write(conn, ids, pending)
+                waiting = 0
+                flushed = time.perf_counter()
+    finally:
+        for symbol, builder in builders.items():
+            bar = builder.flush()
+            if bar is not None:
+                pending[symbol].append(bar)
+        bars += _write(conn, ids, pending)
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    return dict(ticks=count,
+                bars=bars,
+                late=sum(builder.late for builder in builders.values()),
+                seconds=elapsed,
+                ticks_per_second=count / elapsed if elapsed else None)
+
+
+if __name__ == "__main__":
+    import argparse
+    import itertools
+
+    parser = argparse.ArgumentParser(description="trade ticks into bars")
+    parser.add_argument("database")
+    parser.add_argument("filenames", nargs="*", help="tick CSV files")
+    parser.add_argument("--socket", help="host:port or unix socket path")
+    bars = parser.add_mutually_exclusive_group()
+    bars.add_argument("--minutes", type=float, help="time bars (default 1)")
+    bars.add_argument("--volume", type=float, help="volume bars")
+    bars.add_argument("--ticks", type=int, help="tick bars")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.volume:
+        kind, size = VOLUME, args.volume
+    elif args.ticks:
+        kind, size = TICKS, args.ticks
+    else:
+        kind, size = TIME, args.minutes or 1
+
+    sources = [read_ticks(filename) for filename in args.filenames]
+    if args.socket:
+        sources.append(socket_ticks(args.socket))
+
+    report = aggregate(args.database,
+                       itertools.chain.from_iterable(sources),
+                       kind=kind,
+                       size=size,
+                       batch_size=args.batch_size)
+    print(f"*** {report['ticks']} ticks into {report['bars']} bars in "
+          f"{report['seconds']:.2f}s "
+          f"({report['ticks_per_second'] or 0:.0f} ticks/s, "
+          f"{report['late']} late) ***")
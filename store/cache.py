@@ -0,0 +1,235 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from store.compact import compact as compacted
+from store.db import connection
+from store.loader import COLUMNS, iter_arrays, iter_partitions, to_frame
+from store.partition import MANIFEST
+from store.resample import resample
+from store.schema import SESSION, to_epoch, to_minute
+from store.ticks import to_ticks
+
+CACHE_DIRECTORY = "./.cache/bars"
+ARRAYS = ["ts"] + COLUMNS
+
+# part of every entry key; bump when the cached arrays change shape or dtype
+# (2: volume kept as stored rather than truncated to int64, 3: 10080 and
+# 44640 minute bars no longer stand for calendar weeks and months)
+FORMAT = 3
+
+
+def fingerprint(path):
+    if os.path.isdir(path):
+        # a store.partition directory is rewritten with its manifest
+        path = os.path.join(path, MANIFEST)
+
+    # the -wal file holds committed rows that have not been checkpointed
+    # into the main file yet, so it has to count as well
+    stats = []
+    for name in (path, path + "-wal"):
+        if os.path.exists(name):
+            st = os.stat(name)
+            stats.append([st.st_mtime_ns, st.st_size])
+    return stats
+
+
+class BarCache(object):
+    """Per-symbol OHLCV arrays as .npy files, memory-mapped on reload.
+
+    Entries are keyed by database file and query (session window, date
+    range and bar size) and are dropped as soon as the database file
+    changes. ``timeframe`` builds bars of that many minutes from the stored
+    ones, e.g. 15 or ``store.resample.DAILY`` from a 1-minute database, or
+    calendar bars with ``store.resample.WEEKLY``/``MONTHLY``.
+    ``path`` may also be a ``store.partition`` directory, of which only the
+    years overlapping the date range are read. ``compact`` stores float32
+    prices (``store.compact``), ``tick`` int64 prices counted in steps of
+    that size (``store.ticks``, takes precedence over ``compact``).
+    """
+
+    def __init__(self, directory=CACHE_DIRECTORY):
+        self.directory = directory
+
+    def load(self,
+             path,
+             stock_ids=None,
+             session=SESSION,
+             start=None,
+             end=None,
+             timeframe=None,
+             compact=False,
+             tick=None):
+        arrays = self.arrays(path,
+                             stock_ids,
+                             session=session,
+                             start=start,
+                             end=end,
+                             timeframe=timeframe,
+                             compact=compact,
+                             tick=tick)
+        return {
+            stock_id: to_frame(columns)
+            for stock_id, columns in arrays.items()
+        }
+
+    def arrays(self,
+               path,
+               stock_ids=None,
+               session=SESSION,
+               start=None,
+               end=None,
+               timeframe=None,
+               compact=False,
+               tick=None):
+        query = dict(session=session,
+                     start=start,
+                     end=end,
+                     timeframe=timeframe,
+                     compact=compact,
+                     tick=tick)
+        entry = self._entry(path, **query)
+        stock_ids = self._ensure(path, entry, stock_ids, query)
+        return {stock_id: self._open(entry, stock_id) for stock_id in stock_ids}
+
+    def fill(self,
+             path,
+             stock_ids=None,
+             session=SESSION,
+             start=None,
+             end=None,
+             timeframe=None,
+             compact=False,
+             tick=None):
+        """Cache the bars ``arrays`` would return without opening them.
+
+        Missing symbols are loaded in one query; returns the stock ids.
+        """
+        query = dict(session=session,
+                     start=start,
+                     end=end,
+                     timeframe=timeframe,
+                     compact=compact,
+                     tick=tick)
+        return self._ensure(path, self._entry(path, **query), stock_ids, query)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _entry(self, path, session, start, end, timeframe, compact, tick):
+        key = [
+            FORMAT,
+            os.path.abspath(path),
+            None if session is None else [to_minute(t) for t in session],
+            to_epoch(start),
+            to_epoch(end),
+            timeframe,
+            bool(compact),
+            tick,
+        ]
+        digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:20])
+
+    def _ensure(self, path, entry, stock_ids, query):
+        meta = self._meta(entry)
+        if meta is None or meta["fingerprint"] != fingerprint(path):
+            meta = self._fill(path, entry, stock_ids, **query)
+        elif stock_ids is None and not meta["complete"]:
+            meta = self._fill(path, entry, None, **query)
+        elif stock_ids is not None:
+            missing = [s for s in stock_ids if s not in meta["stock_ids"]]
+            if missing:
+                meta = self._fill(path, entry, missing, **query)
+
+        if stock_ids is None:
+            stock_ids = [
+                s for s in meta["stock_ids"] if s not in meta.get("empty", [])
+            ]
+        return list(stock_ids)
+
+    def _meta(self, entry):
+        try:
+            with open(os.path.join(entry, "meta.json")) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _fill(self, path, entry, stock_ids, session, start, end, timeframe,
+              compact, tick):
+        if os.path.isdir(path):
+            bars = iter_partitions(path,
+                                   stock_ids,
+                                   session=session,
+                                   start=start,
+                                   end=end)
+        else:
+            bars = iter_arrays(connection(path),
+                               stock_ids,
+                               session=session,
+                               start=start,
+                               end=end)
+        current = fingerprint(path)
+
+        meta = self._meta(entry)
+        if meta is None or meta["fingerprint"] != current:
+            shutil.rmtree(entry, ignore_errors=True)
+            meta = dict(fingerprint=current, complete=False, stock_ids=[])
+        os.makedirs(entry, exist_ok=True)
+
+        found = set()
+        for stock_id, arrays in bars:
+            if timeframe is not None:
+                arrays = resample(arrays, timeframe)
+            if tick is not None:
+                arrays = to_ticks(arrays, tick)
+            elif compact:
+                arrays = compacted(arrays)
+            self._write(entry, stock_id, arrays)
+            found.add(stock_id)
+
+        # requested symbols without rows are cached as empty series, but
+        # left out when every symbol is asked for
+        empty = set(stock_ids or []) - found
+        for stock_id in empty:
+            self._write(entry, stock_id, self._empty())
+
+        meta["empty"] = sorted(set(meta.get("empty", [])) | empty)
+        meta["stock_ids"] = sorted(set(meta["stock_ids"]) | found | empty)
+        meta["complete"] = meta["complete"] or stock_ids is None
+        self._write_meta(entry, meta)
+        return meta
+
+    def _write(self, entry, stock_id, arrays):
+        target = os.path.join(entry, str(stock_id))
+        staging = tempfile.mkdtemp(dir=entry)
+        for name in ARRAYS:
+            numpy.save(os.path.join(staging, name + ".npy"), arrays[name])
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+
+    def _write_meta(self, entry, meta):
+        fd, staging = tempfile.mkstemp(dir=entry, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(staging, os.path.join(entry, "meta.json"))
+
+    def _open(self, entry, stock_id):
+        target = os.path.join(entry, str(stock_id))
+        arrays = {}
+        for name in ARRAYS:
+            arrays[name] = numpy.load(os.path.join(target, name + ".npy"),
+                                      mmap_mode="r")
+        return arrays
+
+    def _empty(self):
+        arrays = {name: numpy.empty(0) for name in COLUMNS}
+        arrays["ts"] = numpy.empty(0, dtype=numpy.int64)
+        return arrays
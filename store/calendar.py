@@ -0,0 +1,39 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy
+
+
+def day_starts(ts):
+    # index of the first bar of every trading day in a sorted series
+    days = numpy.asarray(ts, dtype=numpy.int64) // 86400
+    return numpy.flatnonzero(numpy.diff(days, prepend=days[:1] - 1))
+
+
+def session_calendar(ts):
+    """Per-bar position within its trading day, as int64 arrays.
+
+    ``minute_of_day`` counts minutes since midnight, ``bar_of_day`` is 0 on
+    the day's first bar and ``bars_left`` is 0 on its last, so day-open and
+    day-close checks are array lookups. ``day_start`` holds the index of
+    every day's first bar.
+    """
+    ts = numpy.asarray(ts, dtype=numpy.int64)
+    if not len(ts):
+        empty = numpy.empty(0, dtype=numpy.int64)
+        return dict(day_start=empty,
+                    minute_of_day=empty,
+                    bar_of_day=empty,
+                    bars_left=empty)
+
+    starts = day_starts(ts)
+    ends = numpy.append(starts[1:], len(ts))
+    lengths = ends - starts
+    index = numpy.arange(len(ts))
+
+    return dict(
+        day_start=starts,
+        minute_of_day=ts % 86400 // 60,
+        bar_of_day=index - numpy.repeat(starts, lengths),
+        bars_left=numpy.repeat(ends - 1, lengths) - index,
+    )
@@ -0,0 +1,74 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy
+
+PRICES = ["open", "high", "low", "close"]
+
+# float32 keeps a 24-bit significand: rounding a float64 price to it moves
+# it by at most half a unit in the last place, 2**-24 of its magnitude
+# (about 0.00016 on a 2650.15 price)
+TOLERANCE = 2.0**-24
+
+
+def volume(values):
+    # int64 when every volume is whole (share counts), float64 otherwise
+    # (fractional crypto volume), so narrowing never drops a fraction
+    values = numpy.asarray(values)
+    if values.dtype.kind == "f" and not numpy.all(numpy.mod(values, 1) == 0):
+        return values.astype(numpy.float64)
+    return values.astype(numpy.int64)
+
+
+def compact(arrays):
+    """Bars with float32 prices and int64 volume, half the price memory.
+
+    ``ts`` and volume are kept exactly (fractional volume stays float64);
+    prices move within ``TOLERANCE`` (relative), see ``check``.
+    """
+    small = dict(arrays)
+    for name in PRICES:
+        small[name] = numpy.asarray(arrays[name]).astype(numpy.float32)
+    small["volume"] = volume(arrays["volume"])
+    return small
+
+
+def error(arrays, small=None):
+    # largest relative price change of the compact copy
+    small = compact(arrays) if small is None else small
+    worst = 0.0
+    for name in PRICES:
+        exact = numpy.asarray(arrays[name], dtype=numpy.float64)
+        if not len(exact):
+            continue
+        moved = numpy.abs(numpy.asarray(small[name], numpy.float64) - exact)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            relative = numpy.where(exact != 0, moved / numpy.abs(exact), moved)
+        worst = max(worst, float(numpy.nanmax(relative)))
+    return worst
+
+
+def check(arrays, tick=None):
+    """Raise ValueError unless compacting ``arrays`` stays within tolerance.
+
+    With ``tick`` the prices must also come back exactly when the float32
+    values are rounded to the tick grid, i.e. nothing but representation
+    error was introduced. Results computed on compact bars (indicators,
+    pnl) then differ from float64 runs by rounding only, though a signal
+    sitting exactly on a threshold can still flip.
+    """
+    small = compact(arrays)
+    worst = error(arrays, small)
+    if worst > TOLERANCE:
+        raise ValueError(f"float32 prices off by {worst:.3g} (relative), "
+                         f"more than {TOLERANCE:.3g}")
+
+    if tick is not None:
+        for name in PRICES:
+            exact = numpy.asarray(arrays[name], dtype=numpy.float64)
+            ticks = numpy.round(numpy.asarray(small[name], numpy.float64) /
+                                tick)
+            if not numpy.allclose(ticks * tick, exact, rtol=0, atol=tick / 1e6):
+                raise ValueError(
+                    f"{name} prices do not round back to a {tick} tick")
+    return worst
@@ -0,0 +1,96 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+from store.schema import require_migrated
+
+# sized for sequential scans of the covering index: map up to 1 GiB of the
+# file instead of copying pages through read(), keep 64 MiB of page cache
+# and build sort/temp b-trees in memory
+MMAP_SIZE = 1 << 30
+CACHE_SIZE = -64 * 1024
+TEMP_STORE = "MEMORY"
+
+logger = logging.getLogger("back_track.store")
+
+# (sql, rows, seconds) of the latest queries run through query()
+timings = collections.deque(maxlen=1000)
+
+_connections = {}
+
+
+def uri(path, mode="ro"):
+    return pathlib.Path(path).resolve().as_uri() + "?mode=" + mode
+
+
+def connect(path, readonly=True):
+    if readonly:
+        conn = sqlite3.connect(uri(path), uri=True)
+        conn.execute("PRAGMA query_only = 1")
+    else:
+        conn = sqlite3.connect(path)
+
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = {CACHE_SIZE}")
+    conn.execute(f"PRAGMA temp_store = {TEMP_STORE}")
+    return conn
+
+
+def connection(path):
+    """Read-only connection to ``path`` reused within this process/thread.
+
+    Keyed by process id, so a worker forked from a parent that already
+    holds one opens its own instead of sharing the inherited handle, and by
+    thread, since a sqlite3 connection stays with the thread that made it.
+    Raises RuntimeError for a database that has not been migrated
+    (``python -m store.schema``); nothing here writes to it.
+    """
+    key = (os.getpid(), threading.get_ident(), os.path.abspath(path))
+    conn = _connections.get(key)
+    if conn is None:
+        conn = connect(path)
+        try:
+            require_migrated(conn)
+        except BaseException:
+            conn.close()
+            raise
+        _connections[key] = conn
+    return conn
+
+
+def close_all(thread=False):
+    # this process's connections, or only the calling thread's
+    pid, ident = os.getpid(), threading.get_ident()
+    for key in list(_connections):
+        if key[0] == pid and (not thread or key[1] == ident):
+            _connections.pop(key).close()
+
+
+def query(conn, sql, params=(), chunksize=250000):
+    # rows in fetchmany() chunks; the timing covers execution and fetching
+    started = time.perf_counter()
+    rows = 0
+
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    try:
+        cursor.execute(sql, params)
+        while True:
+            chunk = cursor.fetchmany(chunksize)
+            if not chunk:
+                break
+            rows += len(chunk)
+            yield chunk
+    finally:
+        cursor.close()
+        elapsed = time.perf_counter() - started
+        statement = " ".join(sql.split())
+        timings.append((statement, rows, elapsed))
+        logger.debug("%d rows in %.3fs: %s", rows, elapsed, statement)
@@ -0,0 +1,295 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import sqlite3
+import time
+import warnings
+
+import numpy
+
+from store.db import logger
+from store.loader import COLUMNS, iter_arrays
+from store.schema import create, migrate
+
+UNIQUE_INDEX = "stock_price_minute_stock_datetime"
+BATCH_SIZE = 50000
+
+# rows parsed at a time from a dump file
+CHUNK_ROWS = 500000
+
+# dump column names mapped onto ours
+ALIASES = {
+    "date": "datetime",
+    "timestamp": "datetime",
+    "open_time": "datetime",
+    "ticker": "symbol",
+    "vol": "volume",
+}
+
+UPSERT = """
+    INSERT INTO stock_price_minute (
+        stock_id, datetime, open, high, low, close, volume, ts, minute_of_day
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (stock_id, datetime) DO UPDATE SET
+        open = excluded.open,
+        high = excluded.high,
+        low = excluded.low,
+        close = excluded.close,
+        volume = excluded.volume,
+        ts = excluded.ts,
+        minute_of_day = excluded.minute_of_day
+"""
+
+
+_DUPLICATES = """
+    FROM stock_price_minute
+    WHERE id NOT IN (
+        SELECT MAX(id) FROM stock_price_minute
+        GROUP BY stock_id, datetime
+    )
+"""
+
+
+def _open(path, timeout):
+    # WAL lets backtests keep reading committed bars while an ingest writes;
+    # synchronous=NORMAL only syncs on checkpoints, which is safe in WAL mode
+    conn = sqlite3.connect(path, timeout=timeout)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def connect(path, timeout=60.0):
+    conn = _open(path, timeout)
+    prepare(conn)
+    return conn
+
+
+def prepare(conn):
+    """Make the database at ``conn`` ready for upserts.
+
+    The first time, bars stored twice for the same symbol and datetime
+    (appended out of band) are deleted, keeping the last copy, so the
+    unique index can be built. Returns how many rows that removed; it is
+    logged as a warning too.
+    """
+    create(conn)
+    migrate(conn)
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+        (UNIQUE_INDEX, )).fetchone()
+    if row is not None:
+        return 0
+
+    with conn:
+        removed = conn.execute("SELECT COUNT(*) " + _DUPLICATES).fetchone()[0]
+        conn.execute("DELETE " + _DUPLICATES)
+        conn.execute(f"""
+            CREATE UNIQUE INDEX {UNIQUE_INDEX}
+            ON stock_price_minute (stock_id, datetime)
+        """)
+    if removed:
+        logger.warning("removed %d duplicate bars from %s", removed,
+                       conn.execute("PRAGMA database_list").fetchone()[2])
+    return removed
+
+
+def stock_id(conn, symbol, company=None):
+    with conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO stock (symbol, company) VALUES (?, ?)",
+            (symbol, company or symbol))
+    row = conn.execute("SELECT id FROM stock WHERE symbol = ?",
+                       (symbol, )).fetchone()
+    return row[0]
+
+
+def to_rows(stock_id, arrays):
+    ts = numpy.asarray(arrays["ts"], dtype=numpy.int64)
+    # the legacy text column, '2021-02-03 09:45:00'
+    text = numpy.char.replace(
+        numpy.datetime_as_string(ts.astype("datetime64[s]")), "T", " ")
+
+    columns = [numpy.full(len(ts), stock_id), text]
+    columns += [numpy.asarray(arrays[name]) for name in COLUMNS]
+    columns += [ts, ts % 86400 // 60]
+    return zip(*(column.tolist() for column in columns))
+
+
+def upsert(conn, stock_id, arrays, batch_size=BATCH_SIZE):
+    # one transaction per batch: large enough to amortize the commit, small
+    # enough that readers see progress and the WAL stays bounded
+    total = len(arrays["ts"])
+    for lo in range(0, total, batch_size):
+        part = {name: values[lo:lo + batch_size]
+                for name, values in arrays.items()}
+        with conn:
+            conn.executemany(UPSERT, to_rows(stock_id, part))
+    return total
+
+
+def check(conn, stock_id, arrays):
+    """Raise ValueError unless ``arrays`` read back from ``conn`` unchanged.
+
+    The bars are loaded the way a backtest would, without a session window
+    (as for 24/7 markets), and must match exactly, fractional volume
+    included. Of bars repeated in ``arrays`` the last one counts, as in
+    ``upsert``.
+    """
+    ts = numpy.asarray(arrays["ts"], dtype=numpy.int64)
+    if not len(ts):
+        return
+
+    _, last = numpy.unique(ts[::-1], return_index=True)
+    keep = len(ts) - 1 - last
+    stored = dict(
+        iter_arrays(conn, [stock_id],
+                    session=None,
+                    start=int(ts[keep[0]]),
+                    end=int(ts[keep[-1]]) + 1)).get(stock_id)
+    if stored is None:
+        raise ValueError(f"no bars of stock {stock_id} read back")
+
+    rows = numpy.searchsorted(stored["ts"], ts[keep])
+    rows = numpy.minimum(rows, len(stored["ts"]) - 1)
+    for name in ["ts"] + COLUMNS:
+        written = numpy.asarray(arrays[name], dtype=numpy.float64)[keep]
+        if not numpy.array_equal(written, stored[name][rows]):
+            raise ValueError(
+                f"{name} of stock {stock_id} does not read back as ingested")
+
+
+def ingest(path, bars, batch_size=BATCH_SIZE, verify=False):
+    """Upsert ``(symbol, arrays)`` pairs into the database at ``path``.
+
+    Re-running the same input is a no-op apart from the rewrite. With
+    ``verify`` every pair is read back and compared (``check``). Returns
+    the row count, elapsed seconds, rows per second and the duplicate rows
+    ``prepare`` removed from an existing database.
+    """
+    conn = _open(path, 60.0)
+    try:
+        duplicates = prepare(conn)
+        started = time.perf_counter()
+        rows = 0
+        ids = {}
+        for symbol, arrays in bars:
+            if symbol not in ids:
+                ids[symbol] = stock_id(conn, symbol)
+            rows += upsert(conn, ids[symbol], arrays, batch_size)
+            if verify:
+                check(conn, ids[symbol], arrays)
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+
+    return dict(rows=rows,
+                seconds=elapsed,
+                rows_per_second=rows / elapsed if elapsed else None,
+                duplicates=duplicates)
+
+
+def parse_times(values):
+    """Epoch seconds from datetime64, epoch numbers or ISO-8601 strings.
+
+    Numbers in ms, us or ns are scaled down by their magnitude; strings go
+    through NumPy's vectorized ISO parser (offsets converted to UTC), then
+    pandas for anything else.
+    """
+    values = numpy.asarray(values)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[s]").astype(numpy.int64)
+
+    if values.dtype.kind in "iuf":
+        scale = 1
+        biggest = numpy.abs(values).max() if len(values) else 0
+        while biggest / scale >= 1e11:
+            scale *= 1000
+        return numpy.floor_divide(values, scale).astype(numpy.int64)
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            parsed = values.astype("datetime64[s]")
+    except ValueError:
+        import pandas
+
+        parsed = pandas.to_datetime(values, utc=True).tz_localize(None)
+        parsed = parsed.values.astype("datetime64[s]")
+    return parsed.astype(numpy.int64)
+
+
+def _split(frame, symbol=None):
+    # a chunk of dump rows into (symbol, arrays) pairs in time order
+    frame = frame.rename(columns=lambda name: ALIASES.get(
+        name.strip().lower(),
+        name.strip().lower()))
+    if "symbol" not in frame:
+        if symbol is None:
+            raise ValueError("no symbol column, pass the symbol")
+        frame["symbol"] = symbol
+
+    frame["ts"] = parse_times(frame["datetime"].to_numpy())
+    frame = frame.sort_values(["symbol", "ts"], kind="stable")
+    for name, rows in frame.groupby("symbol", sort=False):
+        arrays = {"ts": rows["ts"].to_numpy()}
+        for column in COLUMNS:
+            arrays[column] = rows[column].to_numpy()
+        yield str(name), arrays
+
+
+def read_csv(filename, symbol=None, chunksize=CHUNK_ROWS):
+    """``(symbol, arrays)`` pairs from an OHLCV CSV, ``chunksize`` rows at
+    a time, so memory stays flat however big the dump is.
+
+    Columns are symbol,datetime,open,high,low,close,volume (any order or
+    case, with common aliases such as timestamp or ticker); ``symbol``
+    names a file without a symbol column.
+    """
+    import pandas
+
+    for frame in pandas.read_csv(filename, chunksize=chunksize):
+        yield from _split(frame, symbol)
+
+
+def read_parquet(filename, symbol=None, chunksize=CHUNK_ROWS):
+    # read_csv for Parquet files, needs pyarrow
+    import pyarrow.parquet
+
+    dump = pyarrow.parquet.ParquetFile(filename)
+    for batch in dump.iter_batches(batch_size=chunksize):
+        yield from _split(batch.to_pandas(), symbol)
+
+
+def read_dump(filename, symbol=None, chunksize=CHUNK_ROWS):
+    if filename.lower().endswith((".parquet", ".pq")):
+        return read_parquet(filename, symbol, chunksize)
+    return read_csv(filename, symbol, chunksize)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="load CSV or Parquet OHLCV dumps, creating the database "
+        "if needed")
+    parser.add_argument("database")
+    parser.add_argument("filenames", nargs="+")
+    parser.add_argument("--symbol", help="for files without a symbol column")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--check",
+                        action="store_true",
+                        help="read every chunk back and compare")
+    args = parser.parse_args()
+
+    for filename in args.filenames:
+        report = ingest(args.database,
+                        read_dump(filename, args.symbol, args.chunksize),
+                        batch_size=args.batch_size,
+                        verify=args.check)
+        print(f"*** {filename}: {report['rows']} rows in "
+              f"{report['seconds']:.2f}s "
+              f"({report['rows_per_second'] or 0:.0f} rows/s, "
+              f"{report['duplicates']} duplicates removed) ***")
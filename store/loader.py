@@ -0,0 +1,192 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import itertools
+
+import numpy
+import pandas
+
+from store.compact import compact as compacted
+from store.db import connection, query
+from store.partition import plan
+from store.schema import SESSION, bars_query, require_migrated, to_epoch
+from store.ticks import to_ticks
+
+COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+def stock_ids(conn):
+    cursor = conn.execute("""
+        SELECT DISTINCT(stock_id) FROM stock_price_minute ORDER BY stock_id
+    """)
+    return [row[0] for row in cursor]
+
+
+def iter_arrays(conn,
+                stock_ids=None,
+                session=SESSION,
+                start=None,
+                end=None,
+                chunksize=250000,
+                compact=False,
+                tick=None):
+    # one ordered query for every requested symbol, pulled in fixed-size
+    # chunks; a symbol is yielded as soon as its last row has been read
+    require_migrated(conn)
+    sql, params = bars_query(stock_ids, session=session, start=start, end=end)
+    for stock_id, arrays in split_symbols(query(conn, sql, params,
+                                                chunksize)):
+        yield stock_id, _represent(arrays, compact, tick)
+
+
+def iter_partitions(directory,
+                    stock_ids=None,
+                    session=SESSION,
+                    start=None,
+                    end=None,
+                    chunksize=250000,
+                    compact=False,
+                    tick=None):
+    # iter_arrays over a store.partition directory, opening only the years
+    # the date range touches and joining each symbol's years in order
+    pieces = collections.defaultdict(list)
+    for filename in plan(directory, start, end):
+        for stock_id, arrays in iter_arrays(connection(filename),
+                                            stock_ids,
+                                            session=session,
+                                            start=start,
+                                            end=end,
+                                            chunksize=chunksize):
+            pieces[stock_id].append(arrays)
+
+    for stock_id in sorted(pieces):
+        parts = pieces[stock_id]
+        arrays = {
+            name: numpy.concatenate([part[name] for part in parts])
+            for name in parts[0]
+        }
+        yield stock_id, _represent(arrays, compact, tick)
+
+
+def split_symbols(chunks):
+    # (stock_id, ts, open, high, low, close, volume) row chunks ordered by
+    # stock_id into one (stock_id, arrays) pair per symbol
+    pending = []
+    for rows in chunks:
+        block = numpy.array(rows, dtype=numpy.float64).T
+        bounds = _bounds(block[0])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            # a symbol may continue across chunks; emit it once the next
+            # symbol shows up
+            if pending and pending[0][0, 0] != block[0, lo]:
+                yield _emit(pending)
+                pending = []
+            pending.append(block[:, lo:hi])
+
+    if pending:
+        yield _emit(pending)
+
+
+def iter_chunks(conn,
+                stock_id,
+                session=SESSION,
+                start=None,
+                end=None,
+                chunksize=100000,
+                compact=False,
+                tick=None):
+    # one symbol in chunks of whole trading days, each its own keyset query
+    # on ts, so memory stays at one chunk and no read transaction is held
+    # open between chunks
+    start = to_epoch(start)
+    limit = chunksize
+    while True:
+        sql, params = bars_query([stock_id],
+                                 session=session,
+                                 start=start,
+                                 end=end,
+                                 limit=limit)
+        rows = list(itertools.chain.from_iterable(query(conn, sql, params)))
+        if not rows:
+            return
+
+        block = numpy.array(rows, dtype=numpy.float64).T
+        if len(rows) < limit:
+            yield _chunk(block, compact, tick)
+            return
+
+        # hold back the last day, it may continue in the next chunk
+        days = block[1].astype(numpy.int64) // 86400
+        last = numpy.searchsorted(days, days[-1])
+        if last == 0:
+            # a single day longer than the chunk
+            limit *= 2
+            continue
+
+        yield _chunk(block[:, :last], compact, tick)
+        start = int(block[1, last])
+        limit = chunksize
+
+
+def _chunk(block, compact, tick):
+    return _represent(_arrays(block), compact, tick)
+
+
+def _represent(arrays, compact, tick):
+    if tick is not None:
+        return to_ticks(arrays, tick)
+    return compacted(arrays) if compact else arrays
+
+
+def iter_bars(conn,
+              stock_ids=None,
+              session=SESSION,
+              start=None,
+              end=None,
+              chunksize=250000):
+    for stock_id, arrays in iter_arrays(conn,
+                                        stock_ids,
+                                        session=session,
+                                        start=start,
+                                        end=end,
+                                        chunksize=chunksize):
+        yield stock_id, to_frame(arrays)
+
+
+def load_bars(conn, stock_ids=None, session=SESSION, start=None, end=None):
+    bars = dict(
+        iter_bars(conn, stock_ids, session=session, start=start, end=end))
+    for stock_id in stock_ids or []:
+        bars.setdefault(stock_id, to_frame(_arrays(numpy.empty((7, 0)))))
+    return bars
+
+
+def read_bars(conn, stock_id, session=SESSION, start=None, end=None):
+    bars = load_bars(conn, [stock_id], session=session, start=start, end=end)
+    return bars[stock_id]
+
+
+def _bounds(stock_column):
+    change = numpy.flatnonzero(numpy.diff(stock_column)) + 1
+    return numpy.concatenate([[0], change, [len(stock_column)]])
+
+
+def _emit(pieces):
+    block = numpy.concatenate(pieces, axis=1)
+    return int(block[0, 0]), _arrays(block)
+
+
+def _arrays(block):
+    arrays = {"ts": block[1].astype(numpy.int64)}
+    for i, column in enumerate(COLUMNS):
+        arrays[column] = numpy.ascontiguousarray(block[i + 2])
+    return arrays
+
+
+def to_frame(arrays):
+    index = pandas.to_datetime(numpy.asarray(arrays["ts"]), unit="s")
+    index.name = "datetime"
+    return pandas.DataFrame({column: arrays[column]
+                             for column in COLUMNS},
+                            index=index)
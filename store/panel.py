@@ -0,0 +1,139 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from store.cache import CACHE_DIRECTORY, FORMAT, BarCache, fingerprint
+from store.compact import PRICES
+from store.loader import COLUMNS
+from store.schema import SESSION, to_epoch, to_minute
+
+PANEL_DIRECTORY = "./.cache/panels"
+PANEL_ARRAYS = ["ts", "stock_ids", "mask"] + COLUMNS
+
+# gaps take the symbol's last close (a flat, zero-volume bar) or stay NaN
+FFILL = "ffill"
+MASK = "mask"
+
+
+def align(bars, fill=FFILL):
+    """(time x symbol) arrays of ``bars`` on the union of their timestamps.
+
+    ``bars`` maps stock ids to column arrays (``BarCache.arrays``). Returns
+    ``ts`` (T), ``stock_ids`` (S), ``mask`` (T x S, True where the symbol
+    has a bar) and one T x S array per OHLCV field. Prices at gaps are
+    forward-filled from the last close with ``fill=FFILL`` and NaN with
+    ``MASK`` (as they are before a symbol's first bar either way); volume
+    is 0 at gaps.
+    """
+    if fill not in (FFILL, MASK):
+        raise ValueError(f"unknown fill {fill!r}")
+
+    stock_ids = numpy.array(sorted(bars), dtype=numpy.int64)
+    columns = [bars[s] for s in stock_ids]
+    lengths = [len(c["ts"]) for c in columns]
+    stamps = numpy.concatenate([numpy.asarray(c["ts"], dtype=numpy.int64)
+                                for c in columns] or
+                               [numpy.empty(0, dtype=numpy.int64)])
+
+    ts = numpy.unique(stamps)
+    rows = numpy.searchsorted(ts, stamps)
+    cols = numpy.repeat(numpy.arange(len(stock_ids)), lengths)
+    shape = (len(ts), len(stock_ids))
+
+    panel = dict(ts=ts, stock_ids=stock_ids)
+    panel["mask"] = numpy.zeros(shape, dtype=bool)
+    panel["mask"][rows, cols] = True
+
+    for name in PRICES:
+        values = [numpy.asarray(c[name]) for c in columns]
+        dtype = numpy.result_type(numpy.float32, *values)
+        panel[name] = numpy.full(shape, numpy.nan, dtype=dtype)
+        if values:
+            panel[name][rows, cols] = numpy.concatenate(values)
+
+    volume = [numpy.asarray(c["volume"]) for c in columns]
+    dtype = numpy.result_type(numpy.int64, *volume)
+    panel["volume"] = numpy.zeros(shape, dtype=dtype)
+    if volume:
+        panel["volume"][rows, cols] = numpy.concatenate(volume)
+
+    if fill == FFILL and shape[0]:
+        # row of each symbol's latest bar at or before every timestamp
+        last = numpy.where(panel["mask"], numpy.arange(shape[0])[:, None], 0)
+        numpy.maximum.accumulate(last, axis=0, out=last)
+        close = panel["close"][last, numpy.arange(shape[1])]
+        gaps = ~panel["mask"]
+        for name in PRICES:
+            panel[name][gaps] = close[gaps]
+    return panel
+
+
+def _entry(directory, path, stock_ids, fill, session, start, end, timeframe,
+           compact):
+    key = [
+        FORMAT,
+        os.path.abspath(path),
+        None if stock_ids is None else sorted(stock_ids),
+        fill,
+        None if session is None else [to_minute(t) for t in session],
+        to_epoch(start),
+        to_epoch(end),
+        timeframe,
+        bool(compact),
+    ]
+    digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+    return os.path.join(directory, digest[:20])
+
+
+def panel(path,
+          stock_ids=None,
+          fill=FFILL,
+          session=SESSION,
+          start=None,
+          end=None,
+          timeframe=None,
+          compact=False,
+          directory=PANEL_DIRECTORY,
+          bars=CACHE_DIRECTORY):
+    """``align`` over the bars of ``path``, cached on disk.
+
+    Same query arguments as ``BarCache.arrays`` (whose cache in ``bars``
+    supplies the symbols); the panel is saved as .npy files, memory-mapped
+    on reload and rebuilt when the database changes.
+    """
+    query = dict(session=session,
+                 start=start,
+                 end=end,
+                 timeframe=timeframe,
+                 compact=compact)
+    entry = _entry(directory, path, stock_ids, fill, **query)
+    current = fingerprint(path)
+    try:
+        with open(os.path.join(entry, "meta.json")) as f:
+            meta = json.load(f)
+    except (IOError, ValueError):
+        meta = None
+
+    if meta is None or meta["fingerprint"] != current:
+        built = align(BarCache(bars).arrays(path, stock_ids, **query), fill)
+
+        os.makedirs(directory, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=directory)
+        for name in PANEL_ARRAYS:
+            numpy.save(os.path.join(staging, name + ".npy"), built[name])
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump(dict(fingerprint=fingerprint(path)), f)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(staging, entry)
+
+    return {
+        name: numpy.load(os.path.join(entry, name + ".npy"), mmap_mode="r")
+        for name in PANEL_ARRAYS
+    }
@@ -0,0 +1,104 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from store.db import uri
+from store.schema import migrate, require_migrated, to_epoch
+
+MANIFEST = "manifest.json"
+
+
+def partitions_of(path):
+    # app-daily.db -> app-daily.parts/
+    return os.path.splitext(path)[0] + ".parts"
+
+
+def _year_start(year):
+    return to_epoch(datetime.date(year, 1, 1))
+
+
+def split(path, directory=None):
+    """Copy the database at ``path`` into one sqlite file per year.
+
+    Each partition holds the ``stock`` table and that year's bars with the
+    covering index; ``manifest.json`` lists the year bounds for ``plan``.
+    The partitions are a snapshot: split again after the source changes.
+    Returns the partition directory.
+    """
+    source = sqlite3.connect(uri(path), uri=True)
+    try:
+        require_migrated(source)
+        ddl = dict(
+            source.execute("SELECT name, sql FROM sqlite_master "
+                           "WHERE type = 'table' AND name IN "
+                           "('stock', 'stock_price_minute')"))
+        first, last = source.execute(
+            "SELECT min(ts), max(ts) FROM stock_price_minute").fetchone()
+    finally:
+        source.close()
+
+    directory = directory or partitions_of(path)
+    parent = os.path.dirname(os.path.abspath(directory))
+    staging = tempfile.mkdtemp(dir=parent)
+
+    partitions = []
+    if first is not None:
+        for year in range(time.gmtime(first).tm_year,
+                          time.gmtime(last).tm_year + 1):
+            lo, hi = _year_start(year), _year_start(year + 1)
+            filename = f"{year}.db"
+            conn = sqlite3.connect(os.path.join(staging, filename))
+            try:
+                conn.execute("ATTACH DATABASE ? AS source", (uri(path), ))
+                with conn:
+                    for name in ("stock", "stock_price_minute"):
+                        conn.execute(ddl[name])
+                    conn.execute(
+                        "INSERT INTO stock SELECT * FROM source.stock")
+                    conn.execute(
+                        """
+                        INSERT INTO stock_price_minute
+                        SELECT * FROM source.stock_price_minute
+                        WHERE ts >= ? AND ts < ?
+                        ORDER BY stock_id, ts
+                    """, (lo, hi))
+                conn.execute("DETACH DATABASE source")
+                migrate(conn)
+            finally:
+                conn.close()
+            partitions.append([year, lo, hi, filename])
+
+    with open(os.path.join(staging, MANIFEST), "w") as f:
+        json.dump(dict(source=os.path.abspath(path), partitions=partitions),
+                  f)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    return directory
+
+
+def plan(directory, start=None, end=None):
+    """Partition files overlapping [``start``, ``end``), oldest first."""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        partitions = json.load(f)["partitions"]
+
+    start, end = to_epoch(start), to_epoch(end)
+    return [
+        os.path.join(directory, filename)
+        for year, lo, hi, filename in partitions
+        if (start is None or hi > start) and (end is None or lo < end)
+    ]
+
+
+if __name__ == "__main__":
+    import sys
+
+    for path in sys.argv[1:]:
+        print(f"*** {path} -> {split(path)} ***")
@@ -0,0 +1,99 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import mmap
+import queue
+import threading
+
+from store.cache import CACHE_DIRECTORY, BarCache
+from store.db import close_all
+from store.schema import SESSION
+
+# symbols loaded ahead of the one being backtested
+DEPTH = 2
+
+_DONE = object()
+
+
+def _put(ready, stop, item):
+    # False once the consumer has gone away
+    while not stop.is_set():
+        try:
+            ready.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _warm(arrays):
+    # start reading the mapped pages in now rather than under cerebro,
+    # without copying them out of the page cache
+    for values in arrays.values():
+        mapped = getattr(values, "_mmap", None)
+        if mapped is not None and hasattr(mmap, "MADV_WILLNEED"):
+            mapped.madvise(mmap.MADV_WILLNEED)
+
+
+def _produce(ready, stop, path, stock_ids, directory, query):
+    try:
+        cache = BarCache(directory)
+        # one ordered query caches every missing symbol, then each one is
+        # only memory-mapped
+        for stock_id in cache.fill(path, stock_ids, **query):
+            arrays = cache.arrays(path, [stock_id], **query)[stock_id]
+            _warm(arrays)
+            if not _put(ready, stop, (stock_id, arrays)):
+                return
+        _put(ready, stop, _DONE)
+    except BaseException as exc:
+        _put(ready, stop, exc)
+    finally:
+        close_all(thread=True)
+
+
+def prefetch(path,
+             stock_ids=None,
+             depth=DEPTH,
+             session=SESSION,
+             start=None,
+             end=None,
+             timeframe=None,
+             compact=False,
+             tick=None,
+             directory=CACHE_DIRECTORY):
+    """``(stock_id, arrays)`` per symbol, loaded ahead by a background thread.
+
+    Same query arguments as ``BarCache.arrays``, whose memory-mapped arrays
+    are yielded. The loader fills the cache in one query for all symbols
+    (sqlite releases the GIL), then maps up to ``depth`` symbols ahead in a
+    bounded queue and asks the kernel to read their pages in, so the
+    backtest of the current symbol does not wait on disk. Without
+    ``stock_ids`` every symbol with bars in the window is yielded in id
+    order. A loading error is raised here.
+    """
+    query = dict(session=session,
+                 start=start,
+                 end=end,
+                 timeframe=timeframe,
+                 compact=compact,
+                 tick=tick)
+    ready = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    loader = threading.Thread(target=_produce,
+                              args=(ready, stop, path, stock_ids, directory,
+                                    query),
+                              daemon=True)
+    loader.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # the consumer stopped early: let the loader exit
+        stop.set()
+        loader.join()
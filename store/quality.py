@@ -0,0 +1,192 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import json
+import os
+import sqlite3
+import time
+
+import numpy
+import pandas
+
+from store.db import connection, query
+from store.loader import split_symbols
+from store.schema import SESSION, to_minute
+
+VERDICTS = "./.cache/quality.db"
+
+# an issue in ERRORS fails the symbol, the others are reported only
+ERRORS = ["unordered", "duplicates", "bad_ohlc"]
+WARNINGS = ["gaps", "zero_volume", "outliers"]
+
+# a return this many robust standard deviations (MAD-based) from the median
+OUTLIER_SIGMAS = 12.0
+
+_FINGERPRINT = """
+    select stock_id, count(*), min(ts), max(ts), max(id), total(close),
+        total(volume)
+    from stock_price_minute
+    group by stock_id
+"""
+
+# insertion order, so timestamps written out of order show up
+_BARS = """
+    select stock_id, ts, open, high, low, close, volume
+    from stock_price_minute
+    {where}
+    order by stock_id asc, id asc
+"""
+
+
+def check(arrays, session=SESSION, sigmas=OUTLIER_SIGMAS):
+    """Issue counts for one symbol's bars in stored (insertion) order."""
+    ts = numpy.asarray(arrays["ts"], dtype=numpy.int64)
+    o, h, l, c = (numpy.asarray(arrays[name], dtype=numpy.float64)
+                  for name in ("open", "high", "low", "close"))
+    step = numpy.diff(ts)
+
+    issues = dict(rows=len(ts),
+                  unordered=int((step < 0).sum()),
+                  duplicates=int(len(ts) - len(numpy.unique(ts))))
+
+    with numpy.errstate(invalid="ignore"):
+        issues["bad_ohlc"] = int(
+            ((h < l) | (o > h) | (o < l) | (c > h) | (c < l) | (l <= 0)
+             | numpy.isnan(o + h + l + c)).sum())
+    issues["zero_volume"] = int(
+        (numpy.asarray(arrays["volume"]) <= 0).sum())
+
+    # gaps: within a day's session, a step longer than the usual bar spacing
+    ts = numpy.sort(ts)
+    inside = numpy.ones(len(ts), dtype=bool)
+    if session is not None:
+        minute = ts % 86400 // 60
+        inside = ((minute >= to_minute(session[0])) &
+                  (minute < to_minute(session[1])))
+    day = ts // 86400
+    step = numpy.diff(ts)
+    same_day = (day[1:] == day[:-1]) & inside[1:] & inside[:-1] & (step > 0)
+    if same_day.any():
+        spacing = numpy.bincount(step[same_day] // 60).argmax() * 60
+        issues["gaps"] = int((step[same_day] > spacing).sum())
+    else:
+        issues["gaps"] = 0
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        returns = numpy.diff(numpy.log(c))
+    returns = returns[numpy.isfinite(returns)]
+    if len(returns):
+        deviation = numpy.abs(returns - numpy.median(returns))
+        scale = 1.4826 * numpy.median(deviation)
+        limit = sigmas * scale if scale > 0 else numpy.inf
+        issues["outliers"] = int((deviation > limit).sum())
+    else:
+        issues["outliers"] = 0
+
+    issues["ok"] = not any(issues[name] for name in ERRORS)
+    return issues
+
+
+def fingerprints(conn):
+    # per-symbol content summary off the covering index; an append,
+    # correction or delete of a symbol's bars changes it
+    return {
+        row[0]: json.dumps(row[1:])
+        for chunk in query(conn, _FINGERPRINT)
+        for row in chunk
+    }
+
+
+def _open_verdicts(filename):
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    store = sqlite3.connect(filename)
+    columns = [row[1] for row in store.execute("PRAGMA table_info(verdict)")]
+    if columns and "session" not in columns:
+        # verdicts from before they were kept per session: check again
+        with store:
+            store.execute("DROP TABLE verdict")
+    store.execute("""
+        CREATE TABLE IF NOT EXISTS verdict (
+            database TEXT NOT NULL,
+            session TEXT NOT NULL,
+            stock_id INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            checked REAL NOT NULL,
+            issues TEXT NOT NULL,
+            ok INTEGER NOT NULL,
+            PRIMARY KEY (database, session, stock_id)
+        )
+    """)
+    return store
+
+
+def scan(path, stock_ids=None, session=SESSION, verdicts=VERDICTS):
+    """Verdict per symbol of ``path``, rechecking only changed symbols.
+
+    Verdicts live in a separate sqlite file, keyed by database, session
+    window (the gap count depends on it) and symbol and stamped with the
+    symbol's fingerprint, so writing them never touches the price database
+    (nor invalidates the bar cache).
+    """
+    database = os.path.abspath(path)
+    window = json.dumps(None if session is None else
+                        [to_minute(t) for t in session])
+    current = fingerprints(connection(path))
+    if stock_ids is not None:
+        current = {s: current[s] for s in stock_ids if s in current}
+
+    store = _open_verdicts(verdicts)
+    try:
+        known = {
+            stock_id: fingerprint
+            for stock_id, fingerprint in store.execute(
+                "SELECT stock_id, fingerprint FROM verdict "
+                "WHERE database = ? AND session = ?", (database, window))
+        }
+        stale = sorted(s for s in current if known.get(s) != current[s])
+
+        if stale:
+            names = ", ".join(f":s{i}" for i in range(len(stale)))
+            sql = _BARS.format(where=f"where stock_id in ({names})")
+            params = {f"s{i}": s for i, s in enumerate(stale)}
+            rows = []
+            for stock_id, arrays in split_symbols(
+                    query(connection(path), sql, params)):
+                issues = check(arrays, session=session)
+                rows.append((database, window, stock_id, current[stock_id],
+                             time.time(), json.dumps(issues),
+                             int(issues["ok"])))
+            with store:
+                store.executemany(
+                    "INSERT OR REPLACE INTO verdict "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+        table = []
+        for stock_id, issues in store.execute(
+                "SELECT stock_id, issues FROM verdict "
+                "WHERE database = ? AND session = ?", (database, window)):
+            if stock_id in current:
+                table.append(dict(json.loads(issues), stock_id=stock_id))
+    finally:
+        store.close()
+
+    columns = ["stock_id", "rows"] + ERRORS + WARNINGS + ["ok"]
+    table = pandas.DataFrame(table, columns=columns)
+    return table.set_index("stock_id").sort_index()
+
+
+def passing(path, stock_ids=None, session=SESSION, verdicts=VERDICTS):
+    table = scan(path, stock_ids, session=session, verdicts=verdicts)
+    return [int(s) for s in table.index[table["ok"]]]
+
+
+if __name__ == "__main__":
+    import sys
+
+    pandas.set_option("display.width", 120)
+    for path in sys.argv[1:]:
+        print(f"*** {path} ***")
+        print(scan(path))
@@ -0,0 +1,54 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy
+
+DAILY = 24 * 60
+# calendar weeks (starting Monday) and months rather than spans of minutes;
+# strings so that no bar size in minutes (e.g. 10080) is taken for them
+WEEKLY = "W"
+MONTHLY = "M"
+
+# 1970-01-01 was a Thursday
+_MONDAY = 3 * 86400
+
+
+def buckets(ts, minutes):
+    # bars are labelled with the start of their bucket; buckets line up with
+    # midnight, so 5 and 15 minute bars start on 09:30 like the stored ones
+    ts = numpy.asarray(ts, dtype=numpy.int64)
+    if minutes == MONTHLY:
+        months = ts.astype("datetime64[s]").astype("datetime64[M]")
+        return months.astype("datetime64[s]").astype(numpy.int64)
+    if minutes == WEEKLY:
+        return ts - (ts + _MONDAY) % (7 * 86400)
+    if isinstance(minutes, str):
+        raise ValueError(f"unknown timeframe {minutes!r}")
+
+    width = minutes * 60
+    return ts - ts % width
+
+
+def resample(arrays, minutes):
+    """OHLCV arrays of ``minutes`` bars built from finer (1-minute) arrays.
+
+    Only the bars present are aggregated, so a session filter applied when
+    loading carries over: a ``DAILY`` bar covers the session, not the day.
+    ``minutes`` may also be ``WEEKLY`` or ``MONTHLY`` for calendar bars.
+    """
+    labels = buckets(arrays["ts"], minutes)
+    if not len(labels):
+        return {name: numpy.asarray(values)[:0]
+                for name, values in arrays.items()}
+
+    starts = numpy.concatenate([[0], numpy.flatnonzero(numpy.diff(labels)) + 1])
+    ends = numpy.append(starts[1:], len(labels))
+
+    return {
+        "ts": labels[starts],
+        "open": numpy.asarray(arrays["open"])[starts],
+        "high": numpy.maximum.reduceat(arrays["high"], starts),
+        "low": numpy.minimum.reduceat(arrays["low"], starts),
+        "close": numpy.asarray(arrays["close"])[ends - 1],
+        "volume": numpy.add.reduceat(arrays["volume"], starts),
+    }
@@ -0,0 +1,211 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import calendar
+import datetime
+import numbers
+
+# stock_price_minute keeps the original text `datetime` column for the
+# legacy queries and gains two integer columns derived from it:
+#   ts            - epoch seconds of the (naive) bar timestamp
+#   minute_of_day - minutes since midnight, so session filters are integer
+#                   comparisons instead of strftime() on every row
+INDEX_NAME = "stock_price_minute_stock_ts"
+TRIGGER_NAME = "stock_price_minute_fill_ts"
+
+SESSION_START = datetime.time(9, 30)
+SESSION_END = datetime.time(16, 0)
+SESSION = (SESSION_START, SESSION_END)
+
+
+# the original tables, for a database created from scratch; migrate() adds
+# the rest
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS stock (
+        id INTEGER PRIMARY KEY,
+        symbol TEXT NOT NULL UNIQUE,
+        company TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_price_minute (
+        id INTEGER PRIMARY KEY,
+        stock_id INTEGER,
+        datetime REAL NOT NULL,
+        open NUMERIC NOT NULL,
+        high NUMERIC NOT NULL,
+        low NUMERIC NOT NULL,
+        close NUMERIC NOT NULL,
+        volume NUMERIC NOT NULL,
+        FOREIGN KEY (stock_id) REFERENCES stock (id)
+    )
+    """,
+]
+
+
+def create(conn):
+    with conn:
+        for table in TABLES:
+            conn.execute(table)
+
+
+def columns(conn, table="stock_price_minute"):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def is_migrated(conn):
+    names = columns(conn)
+    if "ts" not in names or "minute_of_day" not in names:
+        return False
+
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+        (INDEX_NAME, )).fetchone()
+    return row is not None
+
+
+def require_migrated(conn):
+    # readers never migrate: that would write to the price file
+    if not is_migrated(conn):
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+        raise RuntimeError(f"{path} has not been migrated yet, run: "
+                           f"python -m store.schema {path}")
+
+
+def migrate(conn):
+    if is_migrated(conn):
+        return False
+
+    names = columns(conn)
+    with conn:
+        if "ts" not in names:
+            conn.execute(
+                "ALTER TABLE stock_price_minute ADD COLUMN ts INTEGER")
+        if "minute_of_day" not in names:
+            conn.execute("ALTER TABLE stock_price_minute "
+                         "ADD COLUMN minute_of_day INTEGER")
+
+        conn.execute("""
+            UPDATE stock_price_minute
+            SET ts = CAST(strftime('%s', datetime) AS INTEGER)
+            WHERE ts IS NULL
+        """)
+        conn.execute("""
+            UPDATE stock_price_minute
+            SET minute_of_day = (ts % 86400) / 60
+            WHERE minute_of_day IS NULL
+        """)
+
+        # covering index: a symbol load is an index range scan on
+        # (stock_id, ts) that never touches the table rows
+        conn.execute(f"""
+            CREATE INDEX IF NOT EXISTS {INDEX_NAME}
+            ON stock_price_minute (
+                stock_id, ts, minute_of_day, open, high, low, close, volume
+            )
+        """)
+
+        # rows written out of band with only the text datetime still get
+        # their integer columns
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {TRIGGER_NAME}
+            AFTER INSERT ON stock_price_minute
+            WHEN NEW.ts IS NULL
+            BEGIN
+                UPDATE stock_price_minute
+                SET ts = CAST(strftime('%s', NEW.datetime) AS INTEGER),
+                    minute_of_day =
+                        CAST(strftime('%s', NEW.datetime) AS INTEGER)
+                        % 86400 / 60
+                WHERE id = NEW.id;
+            END
+        """)
+
+    conn.execute("ANALYZE stock_price_minute")
+    return True
+
+
+def to_epoch(value):
+    if value is None:
+        return None
+
+    if isinstance(value, numbers.Number):
+        return int(value)
+
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+
+    return calendar.timegm(value.timetuple())
+
+
+def to_minute(value):
+    if isinstance(value, str):
+        value = datetime.time.fromisoformat(value)
+
+    return value.hour * 60 + value.minute
+
+
+def bars_query(stock_ids=None,
+               session=SESSION,
+               start=None,
+               end=None,
+               limit=None):
+    # every predicate is a range on the covering index: the symbol picks the
+    # index prefix, [start, end) bounds ts, and minute_of_day is checked on
+    # the index entry itself
+    where = []
+    params = {}
+
+    if isinstance(stock_ids, int):
+        stock_ids = [stock_ids]
+
+    if stock_ids is not None:
+        names = []
+        for i, stock_id in enumerate(stock_ids):
+            names.append(f":stock_id_{i}")
+            params[f"stock_id_{i}"] = stock_id
+        where.append(f"stock_id in ({', '.join(names)})")
+
+    if start is not None:
+        where.append("ts >= :start")
+        params["start"] = to_epoch(start)
+
+    if end is not None:
+        where.append("ts < :end")
+        params["end"] = to_epoch(end)
+
+    if session is not None:
+        where.append("minute_of_day >= :session_start")
+        where.append("minute_of_day < :session_end")
+        params["session_start"] = to_minute(session[0])
+        params["session_end"] = to_minute(session[1])
+
+    sql = """
+        select stock_id, ts, open, high, low, close, volume
+        from stock_price_minute
+    """
+    if where:
+        sql += "    where " + "\n        and ".join(where) + "\n"
+    sql += "        order by stock_id asc, ts asc\n"
+    if limit is not None:
+        sql += "        limit :limit\n"
+        params["limit"] = limit
+
+    return sql, params
+
+
+if __name__ == "__main__":
+    import sqlite3
+    import sys
+
+    for path in sys.argv[1:]:
+        conn = sqlite3.connect(path)
+        if migrate(conn):
+            print(f"*** Migrated {path} ***")
+        else:
+            print(f"--- {path} already migrated ---")
+        conn.close()
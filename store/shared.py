@@ -0,0 +1,101 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import atexit
+from multiprocessing import shared_memory
+
+import numpy
+
+# start every array on a cache line
+ALIGNMENT = 64
+
+# segments this process attached to, by name
+_segments = {}
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class SharedBars(object):
+    """Per-symbol arrays published once in a shared memory block.
+
+    ``bars`` maps stock ids to column arrays, e.g. ``BarCache.arrays``.
+    ``handle`` is a small picklable (name, layout) pair workers pass to
+    ``attach`` for zero-copy read-only views. The block is unlinked by
+    ``close``, on leaving the ``with`` block or at interpreter exit; if this
+    process is killed, multiprocessing's resource tracker unlinks it.
+    """
+
+    def __init__(self, bars):
+        layout = {}
+        size = 0
+        for stock_id, arrays in bars.items():
+            entry = {}
+            for name, values in arrays.items():
+                values = numpy.asarray(values)
+                size = _align(size)
+                entry[name] = (size, values.dtype.str, len(values))
+                size += values.nbytes
+            layout[stock_id] = entry
+
+        self._segment = shared_memory.SharedMemory(create=True,
+                                                   size=max(size, 1))
+        for stock_id, arrays in bars.items():
+            for name, values in arrays.items():
+                view = _view(self._segment, *layout[stock_id][name])
+                view[:] = values
+
+        self.handle = (self._segment.name, layout)
+        atexit.register(self.close)
+
+    @property
+    def nbytes(self):
+        return self._segment.size
+
+    def close(self):
+        if self._segment is None:
+            return
+
+        self._segment.close()
+        self._segment.unlink()
+        self._segment = None
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _view(segment, offset, dtype, length):
+    return numpy.ndarray((length, ),
+                         dtype=numpy.dtype(dtype),
+                         buffer=segment.buf,
+                         offset=offset)
+
+
+def attach(handle):
+    """``{stock_id: {column: array}}`` views onto a published block."""
+    name, layout = handle
+    segment = _segments.get(name)
+    if segment is None:
+        segment = _segments[name] = shared_memory.SharedMemory(name=name)
+
+    bars = {}
+    for stock_id, entry in layout.items():
+        arrays = {}
+        for column, spec in entry.items():
+            view = _view(segment, *spec)
+            view.flags.writeable = False
+            arrays[column] = view
+        bars[stock_id] = arrays
+    return bars
+
+
+def detach(handle):
+    # drop this process's mapping; the publisher still owns the block
+    segment = _segments.pop(handle[0], None)
+    if segment is not None:
+        segment.close()
@@ -0,0 +1,44 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy
+
+from store.compact import PRICES, volume
+
+# NSE equities trade in steps of 0.05
+TICK = 0.05
+
+# prices stored as NUMERIC carry float32 noise (37.86999893 for 37.87); a
+# price further than this fraction of a tick from the grid is a real
+# off-grid price (e.g. split-adjusted history), not noise
+GRID_TOLERANCE = 0.05
+
+
+def to_ticks(arrays, tick=TICK, tolerance=GRID_TOLERANCE):
+    """Bars with int64 prices counted in ``tick`` steps.
+
+    Equal prices become equal integers whatever noise they were stored
+    with, so ``open == low`` style checks are exact. Raises ValueError if a
+    price is more than ``tolerance`` ticks off the grid; ``tolerance=None``
+    rounds regardless.
+    """
+    ticks = dict(arrays)
+    for name in PRICES:
+        steps = numpy.asarray(arrays[name], dtype=numpy.float64) / tick
+        rounded = numpy.rint(steps)
+        if tolerance is not None and len(steps):
+            off = float(numpy.nanmax(numpy.abs(steps - rounded)))
+            if off > tolerance:
+                raise ValueError(f"{name} prices are up to {off:.3g} ticks "
+                                 f"off the {tick} grid")
+        ticks[name] = rounded.astype(numpy.int64)
+    ticks["volume"] = volume(arrays["volume"])
+    return ticks
+
+
+def from_ticks(arrays, tick=TICK):
+    # float64 prices, the same value for the same tick count
+    prices = dict(arrays)
+    for name in PRICES:
+        prices[name] = numpy.asarray(arrays[name], dtype=numpy.float64) * tick
+    return prices
@@ -1,66 +1,12 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import logging
 import backtrader
-import pandas
-import sqlite3
 from analyzers.trade_statistics import BasicTradeStats
-
-
-class SuperTrendBand(backtrader.Indicator):
-    params = (('period', 7), ('multiplier', 3))
-    lines = ('basic_ub', 'basic_lb', 'final_ub', 'final_lb')
-
-    def __init__(self):
-        self.atr = backtrader.indicators.AverageTrueRange(period=self.p.period)
-        self.l.basic_ub = ((self.data.high + self.data.low) /
-                           2) + (self.atr * self.p.multiplier)
-        self.l.basic_lb = ((self.data.high + self.data.low) /
-                           2) - (self.atr * self.p.multiplier)
-
-    def next(self):
-        if len(self) - 1 == self.p.period:
-            self.l.final_ub[0] = self.l.basic_ub[0]
-            self.l.final_lb[0] = self.l.basic_lb[0]
-        else:
-            #=IF(OR(basic_ub<final_ub*,close*>final_ub*),basic_ub,final_ub*)
-            if self.l.basic_ub[0] < self.l.final_ub[-1] or self.data.close[
-                    -1] > self.l.final_ub[-1]:
-                self.l.final_ub[0] = self.l.basic_ub[0]
-            else:
-                self.l.final_ub[0] = self.l.final_ub[-1]
-
-            #=IF(OR(baisc_lb > final_lb *, close * < final_lb *), basic_lb *, final_lb *)
-            if self.l.basic_lb[0] > self.l.final_lb[-1] or self.data.close[
-                    -1] < self.l.final_lb[-1]:
-                self.l.final_lb[0] = self.l.basic_lb[0]
-            else:
-                self.l.final_lb[0] = self.l.final_lb[-1]
-
-
-class SuperTrend(backtrader.Indicator):
-    params = (('period', 7), ('multiplier', 3))
-    lines = ('super_trend', )
-    plotinfo = dict(subplot=False)
-
-    def __init__(self):
-        self.stb = SuperTrendBand(period=self.p.period,
-                                  multiplier=self.p.multiplier)
-
-    def next(self):
-        if len(self) - 1 == self.p.period:
-            self.l.super_trend[0] = self.stb.final_ub[0]
-            return
-
-        if self.l.super_trend[-1] == self.stb.final_ub[-1]:
-            if self.data.close[0] <= self.stb.final_ub[0]:
-                self.l.super_trend[0] = self.stb.final_ub[0]
-            else:
-                self.l.super_trend[0] = self.stb.final_lb[0]
-
-        if self.l.super_trend[-1] == self.stb.final_lb[-1]:
-            if self.data.close[0] >= self.stb.final_lb[0]:
-                self.l.super_trend[0] = self.stb.final_lb[0]
-            else:
-                self.l.super_trend[0] = self.stb.final_ub[0]
+from engine.logger import configure, logger
+from feeds.numpy_feed import NumpyData
+from indicators.supertrend import SuperTrend
+from store.prefetch import prefetch
 
 
 class SupertrendStat(backtrader.Strategy):
@@ -79,10 +25,14 @@ class SupertrendStat(backtrader.Strategy):
         self.ema = backtrader.indicators.EMA(period=self.p.ema, plot=True)
         self.st = SuperTrend(self.data, plot=True)
 
-    def log(self, txt, dt=None):
+    def log(self, txt, dt=None, level=logging.INFO):
+        if not logger.isEnabledFor(level):
+            return
+
         if dt is None:
             dt = self.datas[0].datetime.datetime()
-        print("%s, %s" % (dt, txt))
+
+        logger.log(level, "%s, %s", dt, txt)
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -104,7 +54,7 @@ class SupertrendStat(backtrader.Strategy):
                 self.log(f"*** SELL EXECUTED, Price: {order_details} ***")
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log("Order Canceled/Margin/Rejected")
+            self.log("Order Canceled/Margin/Rejected", level=logging.WARNING)
 
         self.order = None
 
@@ -184,47 +134,32 @@ class SupertrendStat(backtrader.Strategy):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless",
+                        action="store_true",
+                        help="no plots, only warnings are logged")
+    args = parser.parse_args()
+    configure(headless=args.headless)
+
     database_path_one_minute = "./databases/app-minute-one.db"
     database_path_fifteen_minute = "./databases/app-minute-fifteen.db"
     database_path_crypto = "./databases/crypto-data.db"
     database_path_five_minute = "./databases/app-minute-five.db"
 
-    # conn = sqlite3.connect(database_path_one_minute)
-    conn = sqlite3.connect(database_path_fifteen_minute)
-    # conn = sqlite3.connect(database_path_crypto)
-    # conn = sqlite3.connect(database_path_five_minute)
-
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(stock_id) as stock_id FROM stock_price_minute
-    """)
+    # database_path = database_path_one_minute
+    database_path = database_path_fifteen_minute
+    # database_path = database_path_crypto
+    # database_path = database_path_five_minute
 
-    stocks = cursor.fetchall()
-    for stock in stocks:
-        print(f"*** Testing {stock['stock_id']} ***")
+    for stock_id, arrays in prefetch(database_path):
+        print(f"*** Testing {stock_id} ***")
         cerebro = backtrader.Cerebro()
         cerebro.broker.setcash(100000.0)
         cerebro.broker.setcommission(commission=0.010)
 
         # cerebro.addsizer(backtrader.sizers.PercentSizer, percents=50)
 
-        dataframe = pandas.read_sql(
-            """
-            select datetime, open, high, low, close, volume
-            from stock_price_minute
-            where stock_id = :stock_id
-            and strftime('%H:%M:%S', datetime) >= '09:30:00' 
-            and strftime('%H:%M:%S', datetime) < '16:00:00'
-            order by datetime asc
-        """,
-            conn,
-            params={"stock_id": stock["stock_id"]},
-            index_col="datetime",
-            parse_dates=["datetime"],
-        )
-
-        data = backtrader.feeds.PandasData(dataname=dataframe)
+        data = NumpyData(dataname=arrays)
         cerebro.adddata(data)
         cerebro.addstrategy(SupertrendStat)
         cerebro.addanalyzer(BasicTradeStats)
@@ -235,4 +170,5 @@ if __name__ == "__main__":
         s = ss
         for each in ss.analyzers:
             each.print()
-        cerebro.plot(style="candlestick")
+        if not args.headless:
+            cerebro.plot(style="candlestick")